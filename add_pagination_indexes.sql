@@ -0,0 +1,5 @@
+-- Indexes backing keyset pagination on (created_at, id)
+CREATE INDEX IF NOT EXISTS products_created_at_id_idx ON products (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS products_category_created_at_id_idx ON products (category_id, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS orders_created_at_id_idx ON orders (created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS orders_user_created_at_id_idx ON orders (user_id, created_at DESC, id DESC);
@@ -0,0 +1,79 @@
+-- Atomic stock reservation for orders
+-- reserve_stock decrements every line of an order in one call, or none of them:
+-- rows are locked in id order (so concurrent orders cannot deadlock) and the
+-- function raises insufficient_stock, listing the short product ids, if any
+-- product does not have enough stock left. The server calls place_order, which
+-- runs it and stores the order in the same transaction.
+
+CREATE OR REPLACE FUNCTION reserve_stock(order_items JSONB)
+RETURNS TABLE (product_id UUID, stock INTEGER)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+  ids UUID[];
+  quantities INTEGER[];
+  short_ids TEXT;
+BEGIN
+  SELECT array_agg(grouped.id ORDER BY grouped.id), array_agg(grouped.quantity ORDER BY grouped.id)
+    INTO ids, quantities
+    FROM (
+      SELECT (item->>'product_id')::UUID AS id, SUM((item->>'quantity')::INTEGER)::INTEGER AS quantity
+      FROM jsonb_array_elements(order_items) AS item
+      GROUP BY 1
+    ) grouped;
+
+  PERFORM 1 FROM products p WHERE p.id = ANY(ids) ORDER BY p.id FOR UPDATE;
+
+  SELECT string_agg(r.id::TEXT, ',') INTO short_ids
+    FROM unnest(ids, quantities) AS r(id, quantity)
+    LEFT JOIN products p ON p.id = r.id
+    WHERE p.id IS NULL OR COALESCE(p.stock, 0) < r.quantity;
+
+  IF short_ids IS NOT NULL THEN
+    RAISE EXCEPTION 'insufficient_stock' USING DETAIL = short_ids;
+  END IF;
+
+  RETURN QUERY
+    UPDATE products p
+    SET stock = p.stock - r.quantity
+    FROM unnest(ids, quantities) AS r(id, quantity)
+    WHERE p.id = r.id
+    RETURNING p.id, p.stock;
+END;
+$$;
+
+-- Places an order: reserves its stock and inserts the order row in the same
+-- transaction, so a failure, timeout or dropped connection leaves either both
+-- or neither behind. Returns the stored order and the new stock level of every
+-- product it took stock from.
+CREATE OR REPLACE FUNCTION place_order(new_order JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  stock_levels JSONB;
+  placed JSONB;
+BEGIN
+  SELECT jsonb_agg(jsonb_build_object('product_id', reserved.product_id, 'stock', reserved.stock))
+    INTO stock_levels
+    FROM reserve_stock(new_order->'items') AS reserved;
+
+  INSERT INTO orders (
+    user_id, user_email, items, total_amount, payment_status, delivery_status,
+    customer_name, customer_phone, customer_address, delivery_charge, delivery_type, created_at
+  )
+  SELECT
+    o.user_id, o.user_email, o.items, o.total_amount,
+    COALESCE(o.payment_status, 'Pending'), COALESCE(o.delivery_status, 'Order Placed'),
+    o.customer_name, o.customer_phone, o.customer_address, o.delivery_charge, o.delivery_type,
+    COALESCE(o.created_at, NOW())
+  FROM jsonb_populate_record(NULL::orders, new_order) AS o
+  RETURNING to_jsonb(orders.*) INTO placed;
+
+  RETURN jsonb_build_object('order', placed, 'stock', COALESCE(stock_levels, '[]'::JSONB));
+END;
+$$;
+
+-- release_stock compensated for a failed order insert, which place_order makes impossible
+DROP FUNCTION IF EXISTS release_stock(JSONB);
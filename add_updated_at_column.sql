@@ -0,0 +1,24 @@
+-- Track when each product row last changed; the API derives Last-Modified from it
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM information_schema.columns WHERE table_name = 'products' AND column_name = 'updated_at'
+  ) THEN
+    ALTER TABLE products ADD COLUMN updated_at TIMESTAMP;
+    UPDATE products SET updated_at = created_at;
+    ALTER TABLE products ALTER COLUMN updated_at SET DEFAULT NOW();
+  END IF;
+END $$;
+
+-- Keep it current for every write, including stock changes made by reserve_stock
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS TRIGGER AS $$
+BEGIN
+  NEW.updated_at := NOW();
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_touch_updated_at ON products;
+CREATE TRIGGER products_touch_updated_at
+  BEFORE UPDATE ON products
+  FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
@@ -0,0 +1,89 @@
+"""Generate resized/WebP variants for product and category images uploaded before
+the variant pipeline existed.
+
+Usage (from the backend directory):
+    python backfill_image_variants.py [--dry-run] [--force]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+from typing import Dict, List
+
+from server import (
+    IMAGE_BUCKET,
+    IMAGE_VARIANT_WIDTHS,
+    IMAGE_WORKERS,
+    image_executor,
+    run_supabase,
+    sniff_image_type,
+    store_variants,
+    supabase,
+    variant_name,
+)
+
+PUBLIC_PATH = f"/object/public/{IMAGE_BUCKET}/"
+
+async def stored_images() -> Dict[str, List[str]]:
+    """Map bucket object name -> tables referencing it, for images hosted in our bucket"""
+    images: Dict[str, List[str]] = {}
+    for table in ("products", "categories"):
+        response = await run_supabase(f"{table}.select", supabase.table(table).select("id,image_url").execute)
+        for row in response.data:
+            url = row.get("image_url") or ""
+            if PUBLIC_PATH in url:
+                name = url.split(PUBLIC_PATH, 1)[1].split("?", 1)[0]
+                images.setdefault(name, []).append(table)
+    return images
+
+async def existing_objects(names: List[str]) -> set:
+    bucket = supabase.storage.from_(IMAGE_BUCKET)
+    existing = set()
+    for folder in {name.rsplit("/", 1)[0] if "/" in name else "" for name in names}:
+        objects = await run_supabase("storage.list", bucket.list, folder, {"limit": 100000})
+        existing.update(f"{folder}/{obj['name']}" if folder else obj["name"] for obj in objects)
+    return existing
+
+async def backfill_image(name: str, semaphore: asyncio.Semaphore) -> bool:
+    async with semaphore:
+        content = await run_supabase("storage.download", supabase.storage.from_(IMAGE_BUCKET).download, name)
+        sniffed = sniff_image_type(content[:16])
+        if not sniffed:
+            print(f"  skipped {name}: not a supported image")
+            return False
+        with tempfile.NamedTemporaryFile(delete=False) as staged:
+            staged.write(content)
+        try:
+            await store_variants(name, staged.name, sniffed[1])
+        finally:
+            os.unlink(staged.name)
+        print(f"  ✓ {name}")
+        return True
+
+async def main(dry_run: bool, force: bool):
+    images = await stored_images()
+    existing = set() if force else await existing_objects(list(images))
+    pending = [
+        name for name in images
+        if variant_name(name, IMAGE_VARIANT_WIDTHS[0], "webp") not in existing
+    ]
+    print(f"{len(images)} stored images, {len(pending)} without variants")
+    if dry_run:
+        for name in pending:
+            print(f"  {name} ({', '.join(images[name])})")
+        return
+
+    semaphore = asyncio.Semaphore(IMAGE_WORKERS * 2)
+    results = await asyncio.gather(*[backfill_image(name, semaphore) for name in pending], return_exceptions=True)
+    for name, result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"  ✗ {name}: {result}")
+    print(f"Backfilled {sum(1 for result in results if result is True)} of {len(pending)} images")
+    image_executor.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="only list images that need variants")
+    parser.add_argument("--force", action="store_true", help="regenerate variants that already exist")
+    args = parser.parse_args()
+    asyncio.run(main(args.dry_run, args.force))
@@ -1,14 +1,50 @@
-from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, status, UploadFile, File, Request, Response, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
 import os
+import asyncio
+import base64
+import csv
+import gzip
+import hashlib
+import html
+import io
+import heapq
+import itertools
+import json
 import logging
+import math
+import multiprocessing
+import numpy as np
+import orjson
+import random
+import re
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from pydantic import BaseModel, EmailStr
-from typing import List, Optional, Dict, Any
-from datetime import datetime
-from supabase import create_client, Client
+from pydantic import BaseModel, EmailStr, ValidationError
+from typing import List, Optional, Dict, Any, Callable, TypeVar, Union
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from supabase import create_client, Client, ClientOptions
+from supabase_auth.errors import AuthRetryableError
+from postgrest import ReturnMethod
+from postgrest.exceptions import APIError
+from cachetools import LRUCache, TLRUCache
+from pyroaring import BitMap
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+import brotli
+from PIL import Image, ImageOps
+import httpx
+import jwt
 import uuid
 
 ROOT_DIR = Path(__file__).parent
@@ -24,15 +60,345 @@ if not supabase_url:
 if not supabase_key:
     raise RuntimeError("SUPABASE_SERVICE_ROLE_KEY is not set")
 
-supabase: Client = create_client(supabase_url, supabase_key)
+SUPABASE_DB_TIMEOUT = float(os.getenv("SUPABASE_DB_TIMEOUT", "5"))
+SUPABASE_AUTH_TIMEOUT = float(os.getenv("SUPABASE_AUTH_TIMEOUT", "5"))
+SUPABASE_STORAGE_TIMEOUT = float(os.getenv("SUPABASE_STORAGE_TIMEOUT", "30"))
 
-app = FastAPI(title="Zouqly API")
+supabase: Client = create_client(
+    supabase_url,
+    supabase_key,
+    options=ClientOptions(
+        postgrest_client_timeout=SUPABASE_DB_TIMEOUT,
+        storage_client_timeout=int(SUPABASE_STORAGE_TIMEOUT)
+    )
+)
+
+# ORJSONResponse is the default response class. Hot routes return it (or cached
+# body bytes) directly, so FastAPI skips jsonable_encoder and response_model
+# validation; the declared response models still document the shapes.
+app = FastAPI(title="Zouqly API", default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Supabase offload pool
+# The supabase client is synchronous, so every call is pushed onto a bounded
+# thread pool instead of running on the event loop.
+SUPABASE_POOL_SIZE = int(os.getenv("SUPABASE_POOL_SIZE", "32"))
+SUPABASE_SLOW_CALL_MS = float(os.getenv("SUPABASE_SLOW_CALL_MS", "1000"))
+
+supabase_executor = ThreadPoolExecutor(max_workers=SUPABASE_POOL_SIZE, thread_name_prefix="supabase")
+supabase_pool_lock = threading.Lock()
+supabase_pool_stats = {
+    "submitted": 0,
+    "queued": 0,
+    "in_flight": 0,
+    "completed": 0,
+    "failed": 0,
+    "max_queue_wait_ms": 0.0,
+}
+
+T = TypeVar("T")
+
+def offload_supabase(operation: str, fn: Callable[..., T], *args, **kwargs) -> "asyncio.Future[T]":
+    """Run a blocking supabase call on the offload pool and record pool stats"""
+    loop = asyncio.get_running_loop()
+    submitted_at = time.perf_counter()
+    with supabase_pool_lock:
+        supabase_pool_stats["submitted"] += 1
+        supabase_pool_stats["queued"] += 1
+
+    def call():
+        started_at = time.perf_counter()
+        wait_ms = (started_at - submitted_at) * 1000
+        with supabase_pool_lock:
+            supabase_pool_stats["queued"] -= 1
+            supabase_pool_stats["in_flight"] += 1
+            if wait_ms > supabase_pool_stats["max_queue_wait_ms"]:
+                supabase_pool_stats["max_queue_wait_ms"] = wait_ms
+        ok = False
+        upstream = upstream_for(operation)
+        try:
+            inject_fault(upstream)
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            with supabase_pool_lock:
+                supabase_pool_stats["in_flight"] -= 1
+                supabase_pool_stats["completed" if ok else "failed"] += 1
+            SUPABASE_QUEUE_WAIT_SECONDS.observe(wait_ms / 1000)
+            SUPABASE_CALL_SECONDS.labels(upstream, operation, "ok" if ok else "error").observe(elapsed_ms / 1000)
+            if elapsed_ms > SUPABASE_SLOW_CALL_MS:
+                logger.warning(f"Slow supabase call {operation}: {elapsed_ms:.0f}ms")
+
+    return loop.run_in_executor(supabase_executor, call)
+
+# Upstream resilience
+# run_supabase gives every call a deadline (per upstream, or per operation in
+# OPERATION_TIMEOUTS), retries transient failures of known read operations
+# with full-jitter backoff, and trips a circuit breaker per upstream (db,
+# auth, storage, taken from the operation label prefix) after consecutive
+# transient failures. Upstream failures surface as 502/503/504 UpstreamErrors,
+# which CatalogCache answers from its last known good entries.
+SUPABASE_RETRY_ATTEMPTS = int(os.getenv("SUPABASE_RETRY_ATTEMPTS", "2"))
+SUPABASE_RETRY_BASE_DELAY = float(os.getenv("SUPABASE_RETRY_BASE_DELAY", "0.1"))
+SUPABASE_RETRY_MAX_DELAY = float(os.getenv("SUPABASE_RETRY_MAX_DELAY", "1"))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+UPSTREAM_TIMEOUTS = {"db": SUPABASE_DB_TIMEOUT, "auth": SUPABASE_AUTH_TIMEOUT, "storage": SUPABASE_STORAGE_TIMEOUT}
+OPERATION_TIMEOUTS = {
+    "orders.export": 15.0,
+    "products.search_index": 15.0,
+    "products.facet_index": 15.0,
+    "products.price_index": 15.0,
+    "products.bulk_insert": 30.0,
+    "products.bulk_upsert": 30.0,
+}
+IDEMPOTENT_ACTIONS = {
+    "select", "select_page", "get", "get_status", "batch", "export",
+    "list_users", "get_user", "jwks", "list", "download",
+}
+TRANSIENT_API_CODES = {"PGRST000", "PGRST001", "PGRST002", "PGRST003", "500", "502", "503", "504"}
+
+# Local fault injection for exercising the resilience layer: a share of calls to
+# the listed upstreams fail with a connection error, and all of them can be slowed.
+fault_injection = {
+    "error_rate": float(os.getenv("SUPABASE_FAULT_ERROR_RATE", "0")),
+    "latency_ms": float(os.getenv("SUPABASE_FAULT_LATENCY_MS", "0")),
+    "upstreams": set(filter(None, os.getenv("SUPABASE_FAULT_UPSTREAMS", "db,auth,storage").split(","))),
+}
+
+def inject_fault(upstream: str):
+    if upstream not in fault_injection["upstreams"]:
+        return
+    if fault_injection["latency_ms"]:
+        time.sleep(fault_injection["latency_ms"] / 1000)
+    if fault_injection["error_rate"] and random.random() < fault_injection["error_rate"]:
+        raise httpx.ConnectError(f"Injected {upstream} fault")
+
+class UpstreamError(HTTPException):
+    def __init__(self, upstream: str, status_code: int, detail: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after else None
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+        self.upstream = upstream
+
+class CircuitBreaker:
+    def __init__(self, upstream: str, failure_threshold: int, cooldown: float):
+        self.upstream = upstream
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.stats = {"opened": 0, "rejected": 0}
+
+    def before_call(self) -> bool:
+        """Raise while the breaker rejects calls; returns True when this call is the half-open probe"""
+        if self.state == "closed":
+            return False
+        remaining = self.opened_at + self.cooldown - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        self.stats["rejected"] += 1
+        raise UpstreamError(self.upstream, 503, f"Upstream {self.upstream} unavailable", max(remaining, 1))
+
+    def record_success(self):
+        self.state = "closed"
+        self.failures = 0
+        self.probing = False
+
+    def release_probe(self):
+        """Free the probe slot of a call that ended without an outcome, so the next call probes"""
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.stats["opened"] += 1
+                logger.warning(f"Circuit breaker for {self.upstream} opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, **self.stats}
+
+circuit_breakers = {upstream: CircuitBreaker(upstream, BREAKER_FAILURE_THRESHOLD, BREAKER_COOLDOWN) for upstream in UPSTREAM_TIMEOUTS}
+
+def upstream_for(operation: str) -> str:
+    prefix = operation.split(".", 1)[0]
+    return prefix if prefix in ("auth", "storage") else "db"
+
+def is_idempotent(operation: str) -> bool:
+    action = operation.split(".", 1)[-1]
+    return action in IDEMPOTENT_ACTIONS or action.endswith("_index")
+
+def is_transient(error: Exception) -> bool:
+    if isinstance(error, (TimeoutError, httpx.TransportError, AuthRetryableError)):
+        return True
+    if isinstance(error, APIError):
+        return str(error.code) in TRANSIENT_API_CODES
+    status = getattr(error, "status", None)
+    return str(status).isdigit() and int(status) >= 500
+
+async def run_supabase(operation: str, fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a supabase call with a deadline, retries for idempotent reads and the upstream's circuit breaker"""
+    upstream = upstream_for(operation)
+    breaker = circuit_breakers[upstream]
+    timeout = OPERATION_TIMEOUTS.get(operation, UPSTREAM_TIMEOUTS[upstream])
+    attempts = 1 + (SUPABASE_RETRY_ATTEMPTS if is_idempotent(operation) else 0)
+    for attempt in range(attempts):
+        probe = breaker.before_call()
+        try:
+            result = await asyncio.wait_for(offload_supabase(operation, fn, *args, **kwargs), timeout)
+        except Exception as e:
+            if not is_transient(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            logger.warning(f"Supabase call {operation} failed (attempt {attempt + 1}/{attempts}): {e!r}")
+            if attempt + 1 < attempts and breaker.state == "closed":
+                await asyncio.sleep(random.uniform(0, min(SUPABASE_RETRY_MAX_DELAY, SUPABASE_RETRY_BASE_DELAY * 2 ** attempt)))
+                continue
+            if isinstance(e, TimeoutError):
+                raise UpstreamError(upstream, 504, f"Upstream {upstream} timed out") from e
+            raise UpstreamError(upstream, 502, f"Upstream {upstream} request failed") from e
+        except BaseException:
+            # Cancelled (e.g. the client went away): says nothing about the upstream
+            if probe:
+                breaker.release_probe()
+            raise
+        breaker.record_success()
+        return result
+
+def supabase_pool_snapshot() -> Dict[str, Any]:
+    with supabase_pool_lock:
+        return {
+            "size": SUPABASE_POOL_SIZE,
+            **supabase_pool_stats,
+            "breakers": {upstream: breaker.snapshot() for upstream, breaker in circuit_breakers.items()}
+        }
+
+# Metrics
+# Prometheus metrics served at /api/metrics. Requests are timed per route
+# template by a plain ASGI middleware, supabase calls per upstream and
+# operation on the offload pool, and event-loop lag by a sleeping probe task.
+# Pool, cache, breaker and admission figures are read from their existing
+# snapshots at scrape time, so they cost nothing on the request path.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+EVENT_LOOP_PROBE_INTERVAL = float(os.getenv("EVENT_LOOP_PROBE_INTERVAL", "0.5"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_REQUESTS = Counter("http_requests", "HTTP requests by route template and status", ["method", "route", "status"])
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+SUPABASE_CALL_SECONDS = Histogram(
+    "supabase_call_duration_seconds", "Supabase call latency by upstream and operation",
+    ["upstream", "operation", "outcome"], buckets=LATENCY_BUCKETS
+)
+SUPABASE_QUEUE_WAIT_SECONDS = Histogram(
+    "supabase_pool_queue_wait_seconds", "Time supabase calls wait for an offload thread", buckets=LATENCY_BUCKETS
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds", "How late the event loop wakes a sleeping probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        # Labelled children are cached so the hot path skips labels() lookups
+        self.timers: Dict[tuple, Any] = {}
+        self.counters: Dict[tuple, Any] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            key = (scope["method"], getattr(scope.get("route"), "path", "unmatched"))
+            timer = self.timers.get(key)
+            if timer is None:
+                timer = self.timers[key] = HTTP_REQUEST_SECONDS.labels(*key)
+            timer.observe(elapsed)
+            counter = self.counters.get((key, status_code))
+            if counter is None:
+                counter = self.counters[(key, status_code)] = HTTP_REQUESTS.labels(*key, str(status_code))
+            counter.inc()
+
+async def probe_event_loop():
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(EVENT_LOOP_PROBE_INTERVAL)
+        EVENT_LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - started_at - EVENT_LOOP_PROBE_INTERVAL))
+
+class ServerStatsCollector:
+    """Expose the in-process snapshots (pool, caches, breakers, admission) at scrape time"""
+
+    def collect(self):
+        pool = supabase_pool_snapshot()
+        for name in ("queued", "in_flight"):
+            yield GaugeMetricFamily(f"supabase_pool_{name}", f"Supabase offload calls {name.replace('_', ' ')}", value=pool[name])
+        yield GaugeMetricFamily("supabase_pool_size", "Supabase offload pool threads", value=pool["size"])
+        calls = CounterMetricFamily("supabase_pool_calls", "Supabase offload calls by result", labels=["result"])
+        for result in ("completed", "failed"):
+            calls.add_metric([result], pool[result])
+        yield calls
+
+        breaker_state = GaugeMetricFamily("circuit_breaker_state", "1 for the current breaker state", labels=["upstream", "state"])
+        breaker_rejections = CounterMetricFamily("circuit_breaker_rejections", "Calls rejected by an open breaker", labels=["upstream"])
+        for upstream, breaker in pool["breakers"].items():
+            for state in ("closed", "open", "half_open"):
+                breaker_state.add_metric([upstream, state], 1 if breaker["state"] == state else 0)
+            breaker_rejections.add_metric([upstream], breaker["rejected"])
+        yield breaker_state
+        yield breaker_rejections
+
+        cache = catalog_cache.snapshot()
+        lookups = CounterMetricFamily("catalog_cache_lookups", "Catalog cache lookups by result", labels=["result"])
+        for result in ("hits", "negative_hits", "misses", "stale_served"):
+            lookups.add_metric([result], cache[result])
+        yield lookups
+        yield CounterMetricFamily("catalog_cache_invalidations", "Catalog cache entries invalidated", value=cache["invalidations"])
+        yield GaugeMetricFamily("catalog_cache_entries", "Catalog cache entries", value=cache["size"])
+        yield GaugeMetricFamily("catalog_cache_hit_ratio", "Catalog cache hit ratio since start", value=cache["hit_ratio"])
+
+        uploads = upload_index.snapshot()
+        yield CounterMetricFamily("upload_duplicates", "Uploads answered from the content-hash index", value=uploads["duplicates"])
+        yield CounterMetricFamily("upload_bytes_saved", "Storage bytes saved by upload deduplication", value=uploads["bytes_saved"])
+
+        in_flight = GaugeMetricFamily("admission_in_flight", "Requests holding an admission slot", labels=["route_class"])
+        rejections = CounterMetricFamily("admission_rejections", "Requests rejected with 429", labels=["route_class", "reason"])
+        for route_class, control in admission_snapshot().items():
+            in_flight.add_metric([route_class], control["in_flight"])
+            for reason, count in control["rejected"].items():
+                rejections.add_metric([route_class, reason], count)
+        yield in_flight
+        yield rejections
+
 # Models
 class UserRegister(BaseModel):
     email: EmailStr
@@ -75,6 +441,49 @@ class OrderBase(BaseModel):
     delivery_charge: Optional[float] = 0
     delivery_type: Optional[str] = None
 
+class Product(ProductBase):
+    id: str
+    is_featured: Optional[bool] = None
+    created_at: Optional[str] = None
+    updated_at: Optional[str] = None
+
+class FacetedProducts(BaseModel):
+    total: int
+    products: List[Product]
+    facets: Dict[str, Dict[str, int]]
+
+class ProductBatch(BaseModel):
+    products: List[Product]
+    missing: List[str]
+
+class Order(OrderBase):
+    id: str
+    user_id: str
+    user_email: str
+    created_at: Optional[str] = None
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+
+class QuoteItem(BaseModel):
+    product_id: str
+    quantity: int
+
+class OrderQuoteRequest(BaseModel):
+    items: List[QuoteItem]
+    delivery_type: Optional[str] = None
+
+class OrderStatusFilter(BaseModel):
+    payment_status: Optional[str] = None
+    delivery_status: Optional[str] = None
+    created_before: Optional[str] = None
+
+class OrderStatusBulkUpdate(BaseModel):
+    order_ids: Optional[List[str]] = None
+    filter: Optional[OrderStatusFilter] = None
+    payment_status: Optional[str] = None
+    delivery_status: Optional[str] = None
+
 class TestimonialBase(BaseModel):
     name: str
     rating: int
@@ -84,19 +493,465 @@ class ContentBase(BaseModel):
     page: str
     content: str
 
+# Catalog cache
+# Read-through cache for categories, products, testimonials and content pages,
+# invalidated by the admin write routes. A version counter guards against a
+# slow read repopulating an entry that was invalidated while it was in flight.
+CATALOG_CACHE_TTL = float(os.getenv("CATALOG_CACHE_TTL", "300"))
+CATALOG_NEGATIVE_TTL = float(os.getenv("CATALOG_NEGATIVE_TTL", "30"))
+CATALOG_CACHE_SIZE = int(os.getenv("CATALOG_CACHE_SIZE", "2048"))
+
+NOT_FOUND = object()
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+class CatalogEntry:
+    """A cached payload with its JSON body, ETag and modification time, built on first use"""
+    __slots__ = ("data", "_body", "_etag", "_last_modified", "_encoded")
+    media_type = "application/json"
+
+    def __init__(self, data: Any):
+        self.data = data
+        self._body = None
+        self._etag = None
+        self._last_modified = None
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            self._body = orjson.dumps(self.data)
+        return self._body
+
+    @property
+    def etag(self) -> str:
+        if self._etag is None:
+            self._etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+        return self._etag
+
+    def encoded(self, encoding: str) -> bytes:
+        """The body compressed with encoding, compressed once per entry"""
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress_body(self.body, encoding, CATALOG_COMPRESSION_LEVELS[encoding])
+        return self._encoded[encoding]
+
+    @property
+    def last_modified(self) -> Optional[datetime]:
+        """The row's updated_at; lists have none, since a deleted row leaves no timestamp behind"""
+        if self._last_modified is None:
+            stamp = parse_timestamp(self.data.get("updated_at")) if isinstance(self.data, dict) else None
+            self._last_modified = stamp or False
+        return self._last_modified or None
+
+class CatalogCache:
+    def __init__(self, ttl: float, negative_ttl: float, maxsize: int):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = TLRUCache(maxsize=maxsize, ttu=self._expires_at)
+        # Last known good entry per key, kept past expiry and invalidation so
+        # reads can still be answered while the upstream is failing
+        self.stale = LRUCache(maxsize=maxsize)
+        self.version = 0
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "invalidations": 0, "stale_served": 0}
+
+    def _expires_at(self, key, value, now):
+        return now + (self.negative_ttl if value is NOT_FOUND else self.ttl)
+
+    def lookup(self, key: tuple) -> Any:
+        value = self.entries.get(key)
+        if value is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["negative_hits" if value is NOT_FOUND else "hits"] += 1
+        return value
+
+    def store(self, key: tuple, value: Any, version: int) -> Any:
+        """Cache a freshly loaded value unless the cache was invalidated since version was read"""
+        if value is not NOT_FOUND:
+            value = CatalogEntry(value)
+        if version == self.version:
+            self.entries[key] = value
+            if value is not NOT_FOUND:
+                self.stale[key] = value
+        return value
+
+    async def get_or_load(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        version = self.version
+        try:
+            loaded = await loader()
+        except UpstreamError:
+            stale = self.stale.get(key)
+            if stale is None:
+                raise
+            self.stats["stale_served"] += 1
+            logger.warning(f"Serving stale {key[0]} entry while upstream is failing")
+            return stale
+        return self.store(key, loaded, version)
+
+    def invalidate(self, *keys: tuple):
+        self.version += 1
+        for key in keys:
+            if self.entries.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def invalidate_product(self, product_id: str, *category_ids: Optional[str]):
+        """Drop a product entry plus every list that is, or could now be, showing it"""
+        categories = {None, *category_ids}
+        self.invalidate(("product", product_id), *[
+            key for key, entry in list(self.entries.items())
+            if key[0] == "products" and (key[1] in categories or any(p.get("id") == product_id for p in entry.data))
+        ])
+
+    def invalidate_products(self):
+        self.invalidate(*[key for key in list(self.entries.keys()) if key[0] in ("product", "products")])
+
+    def snapshot(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["negative_hits"] + self.stats["misses"]
+        hit_ratio = (self.stats["hits"] + self.stats["negative_hits"]) / lookups if lookups else 0.0
+        return {
+            **self.stats,
+            "size": len(self.entries),
+            "maxsize": self.entries.maxsize,
+            "version": self.version,
+            "hit_ratio": round(hit_ratio, 4),
+        }
+
+catalog_cache = CatalogCache(CATALOG_CACHE_TTL, CATALOG_NEGATIVE_TTL, CATALOG_CACHE_SIZE)
+
+# Response compression
+# CompressionMiddleware negotiates br/gzip for compressible bodies of at least
+# COMPRESSION_MIN_SIZE bytes, compressing streamed responses chunk by chunk.
+# Cached catalog bodies are compressed once per entry at a higher level and
+# served pre-encoded; the middleware passes anything already encoded through.
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_LEVELS = {"br": int(os.getenv("BROTLI_QUALITY", "4")), "gzip": int(os.getenv("GZIP_LEVEL", "6"))}
+CATALOG_COMPRESSION_LEVELS = {"br": 9, "gzip": 9}
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, preferring br on ties"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        weight = 1.0
+        if params.strip().startswith("q="):
+            try:
+                weight = float(params.strip()[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip()] = weight
+    candidates = [(weights.get(coding, weights.get("*", 0.0)), coding) for coding in ("br", "gzip")]
+    weight, coding = max(candidates, key=lambda candidate: candidate[0])
+    return coding if weight > 0 else None
+
+def compress_body(body: bytes, encoding: str, level: int) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+class StreamCompressor:
+    def __init__(self, encoding: str, level: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self.compressor = brotli.Compressor(quality=level)
+        else:
+            self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.process(chunk) + self.compressor.flush()
+        return self.compressor.compress(chunk) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Optional[StreamCompressor] = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message["headers"])
+                content_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+                if passthrough:
+                    await send(message)
+                else:
+                    if "accept-encoding" not in headers.get("vary", "").lower():
+                        headers.add_vary_header("Accept-Encoding")
+                    start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start_message)
+                    await send(message)
+                    passthrough = True
+                    return
+                headers["Content-Encoding"] = encoding
+                if more_body:
+                    del headers["Content-Length"]
+                    compressor = StreamCompressor(encoding, COMPRESSION_LEVELS[encoding])
+                    body = compressor.compress(body)
+                else:
+                    body = compress_body(body, encoding, COMPRESSION_LEVELS[encoding])
+                    headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                start_message = None
+                await send({"type": "http.response.body", "body": body, "more_body": more_body})
+                return
+
+            if compressor is not None:
+                body = compressor.compress(body) if more_body else compressor.compress(body) + compressor.finish()
+            await send({"type": "http.response.body", "body": body, "more_body": more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+# Conditional GETs
+CATEGORIES_CACHE_CONTROL = os.getenv("CATEGORIES_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=600")
+PRODUCTS_CACHE_CONTROL = os.getenv("PRODUCTS_CACHE_CONTROL", "public, max-age=60, stale-while-revalidate=300")
+TESTIMONIALS_CACHE_CONTROL = os.getenv("TESTIMONIALS_CACHE_CONTROL", "public, max-age=300, stale-while-revalidate=600")
+CONTENT_CACHE_CONTROL = os.getenv("CONTENT_CACHE_CONTROL", "public, max-age=3600, stale-while-revalidate=86400")
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+def conditional_response(request: Request, entry: CatalogEntry, cache_control: str) -> Response:
+    """Serve a cached entry, pre-compressed when the client accepts it, or a
+    bare 304 when the client already holds it"""
+    encoding = None
+    if len(entry.body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+    # Each encoding is a distinct representation, so it gets its own strong ETag
+    etag = f'{entry.etag[:-1]}-{encoding}"' if encoding else entry.etag
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    # Last-Modified only comes from a row's own updated_at; anything else would
+    # let If-Modified-Since revalidate data another worker has since changed
+    last_modified = entry.last_modified
+    if last_modified:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        return Response(content=entry.encoded(encoding), media_type=entry.media_type, headers=headers)
+    return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+# Sparse fieldsets
+# fields= takes either a named view or a comma separated column list, validated
+# against the model schemas and pushed down into the select.
+PRODUCT_COLUMNS = set(Product.model_fields)
+ORDER_COLUMNS = set(Order.model_fields)
+PRODUCT_VIEWS = {
+    "card": ("id", "name", "price", "weight", "image_url", "stock"),
+}
+ORDER_VIEWS = {
+    "summary": (
+        "id", "created_at", "user_email", "customer_name", "total_amount",
+        "delivery_charge", "payment_status", "delivery_status"
+    ),
+}
+
+def parse_fields(fields: Optional[str], allowed: set, views: Dict[str, tuple], required: tuple = ("id",)) -> Optional[tuple]:
+    if not fields:
+        return None
+    names = views.get(fields) or [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - allowed)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys([*required, *names]))
+
+def select_columns(columns: Optional[tuple]) -> str:
+    return ",".join(columns) if columns else "*"
+
+# Keyset pagination
+# Pages are ordered by (created_at, id) descending and the cursor encodes the
+# last row of the previous page, so every page costs the same however deep it is.
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "200"))
+
+def encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([row.get("created_at"), row.get("id")], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(row_id))
+    except (ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_keyset(query, limit: int, cursor: Optional[str], descending: bool = True):
+    query = query.order("created_at", desc=descending).order("id", desc=descending)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        op = "lt" if descending else "gt"
+        query = query.or_(f'created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}.{row_id})')
+    return query.limit(limit + 1)
+
+async def iter_keyset_pages(operation: str, make_query: Callable[[], Any], page_size: int):
+    """Yield make_query()'s rows oldest first, one keyset page of at most page_size rows per call"""
+    cursor = None
+    while True:
+        query = apply_keyset(make_query(), page_size, cursor, descending=False)
+        response = await run_supabase(operation, query.execute)
+        rows = response.data
+        yield rows[:page_size]
+        if len(rows) <= page_size:
+            return
+        cursor = encode_cursor(rows[page_size - 1])
+
+def paginated_response(rows: List[Dict[str, Any]], limit: int) -> ORJSONResponse:
+    """Trim the look-ahead row and expose the next cursor in X-Next-Cursor"""
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor(rows[-1])
+    return ORJSONResponse(rows, headers=headers)
+
 # Auth dependency
+# Tokens are verified locally against the project JWT secret (HS256) or the
+# cached JWKS signing keys; the remote get_user lookup is only an opt-in fallback.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+AUTH_REMOTE_FALLBACK = os.getenv("AUTH_REMOTE_FALLBACK", "false").lower() == "true"
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", "600"))
+JWT_AUDIENCE = os.getenv("JWT_AUDIENCE", "authenticated")
+JWT_ASYMMETRIC_ALGORITHMS = {"RS256", "ES256"}
+
+if not SUPABASE_JWT_SECRET and not AUTH_REMOTE_FALLBACK:
+    logger.warning(
+        "SUPABASE_JWT_SECRET is not set and AUTH_REMOTE_FALLBACK is off: HS256 access tokens "
+        "(the Supabase default) will be rejected with 401. Set SUPABASE_JWT_SECRET to the "
+        "project's JWT secret, or AUTH_REMOTE_FALLBACK=true to verify tokens through Supabase Auth."
+    )
+
+jwks_client = jwt.PyJWKClient(
+    f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json",
+    cache_keys=True,
+    lifespan=JWKS_CACHE_TTL,
+)
+verified_tokens: LRUCache = LRUCache(maxsize=AUTH_TOKEN_CACHE_SIZE)
+
+async def get_signing_key(token: str, algorithm: str) -> Optional[Any]:
+    if algorithm == "HS256":
+        return SUPABASE_JWT_SECRET
+    if algorithm not in JWT_ASYMMETRIC_ALGORITHMS:
+        raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm {algorithm}")
+    try:
+        signing_key = await run_supabase("auth.jwks", jwks_client.get_signing_key_from_jwt, token)
+        return signing_key.key
+    except jwt.PyJWKClientError as e:
+        logger.warning(f"JWKS lookup failed: {str(e)}")
+        return None
+
+async def verify_token_locally(token: str) -> Optional[tuple]:
+    """Return (user, expires_at) for a valid token, or None if no key is available to check it"""
+    algorithm = jwt.get_unverified_header(token).get("alg")
+    key = await get_signing_key(token, algorithm)
+    if key is None:
+        return None
+
+    claims = jwt.decode(
+        token,
+        key,
+        algorithms=[algorithm],
+        audience=JWT_AUDIENCE,
+        options={"require": ["exp", "sub"]},
+    )
+    user = {
+        "id": claims["sub"],
+        "email": claims.get("email"),
+        "role": (claims.get("user_metadata") or {}).get("role", "user")
+    }
+    return user, claims["exp"]
+
+async def get_user_remote(token: str) -> Dict[str, Any]:
+    user = await run_supabase("auth.get_user", supabase.auth.get_user, token)
+    if not user or not user.user:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    return {
+        "id": user.user.id,
+        "email": user.user.email,
+        "role": user.user.user_metadata.get("role", "user")
+    }
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     token = credentials.credentials
+    cache_key = hashlib.sha256(token.encode()).digest()
+    cached = verified_tokens.get(cache_key)
+    if cached and cached[1] > time.time():
+        return dict(cached[0])
+
     try:
-        user = supabase.auth.get_user(token)
-        if not user or not user.user:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        return {
-            "id": user.user.id,
-            "email": user.user.email,
-            "role": user.user.user_metadata.get("role", "user")
-        }
+        verified = await verify_token_locally(token)
+        if verified is None:
+            if not AUTH_REMOTE_FALLBACK:
+                raise HTTPException(status_code=401, detail="Authentication failed")
+            return await get_user_remote(token)
+
+        user, expires_at = verified
+        verified_tokens[cache_key] = (user, expires_at)
+        return dict(user)
+    except HTTPException:
+        raise
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Rejected token: {str(e)}")
+        raise HTTPException(status_code=401, detail="Invalid token")
     except Exception as e:
         logger.error(f"Auth error: {str(e)}")
         raise HTTPException(status_code=401, detail="Authentication failed")
@@ -106,11 +961,246 @@ async def require_admin(user: Dict = Depends(get_current_user)) -> Dict:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+# Admission control
+# Login, register and order creation are guarded by in-process token buckets
+# (per client IP, and per user for orders) and a concurrency cap per route
+# class; over-limit requests get 429 with Retry-After before any upstream call.
+# Limits are "<requests>/<seconds>". Buckets are (tokens, timestamp) tuples and
+# idle ones are swept, since a full bucket is the same as a missing one.
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10/60")
+REGISTER_RATE_LIMIT = os.getenv("REGISTER_RATE_LIMIT", "5/600")
+ORDER_IP_RATE_LIMIT = os.getenv("ORDER_IP_RATE_LIMIT", "30/60")
+ORDER_USER_RATE_LIMIT = os.getenv("ORDER_USER_RATE_LIMIT", "10/60")
+AUTH_MAX_CONCURRENCY = int(os.getenv("AUTH_MAX_CONCURRENCY", "20"))
+ORDER_MAX_CONCURRENCY = int(os.getenv("ORDER_MAX_CONCURRENCY", "20"))
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "60"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+
+class TokenBucket:
+    def __init__(self, limit: str):
+        capacity, period = limit.split("/")
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(period)
+        self.buckets: Dict[str, tuple] = {}
+        self.swept_at = time.monotonic()
+
+    def acquire(self, key: str) -> float:
+        """Take a token for key; returns 0 when allowed, else seconds until one is available"""
+        now = time.monotonic()
+        if now - self.swept_at >= RATE_LIMIT_SWEEP_INTERVAL:
+            self.sweep(now)
+        tokens, stamp = self.buckets.get(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - stamp) * self.rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate
+        self.buckets[key] = (tokens - 1, now)
+        return 0.0
+
+    def sweep(self, now: float):
+        refill_time = self.capacity / self.rate
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if now - bucket[1] < refill_time}
+        self.swept_at = now
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[-1].strip()
+    return request.client.host if request.client else "unknown"
+
+class AdmissionControl:
+    def __init__(self, route_class: str, per_ip: TokenBucket, per_user: Optional[TokenBucket], max_concurrency: int):
+        self.route_class = route_class
+        self.per_ip = per_ip
+        self.per_user = per_user
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.rejected: Dict[str, int] = {}
+
+    def reject(self, reason: str, retry_after: float):
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def admit(self, request: Request, user: Optional[Dict]):
+        retry_after = self.per_ip.acquire(client_ip(request))
+        if retry_after:
+            self.reject("ip_rate", retry_after)
+        if self.per_user is not None and user is not None:
+            retry_after = self.per_user.acquire(user["id"])
+            if retry_after:
+                self.reject("user_rate", retry_after)
+        if self.in_flight >= self.max_concurrency:
+            self.reject("concurrency", 1)
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        buckets = [bucket for bucket in (self.per_ip, self.per_user) if bucket]
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "tracked_keys": sum(len(bucket.buckets) for bucket in buckets),
+            "rejected": dict(self.rejected),
+        }
+
+def admission_dependency(control: AdmissionControl):
+    """Route dependency holding an admission slot for the duration of the request"""
+    if control.per_user is None:
+        async def admit(request: Request):
+            control.admit(request, None)
+            try:
+                yield
+            finally:
+                control.release()
+    else:
+        async def admit(request: Request, user: Dict = Depends(get_current_user)):
+            control.admit(request, user)
+            try:
+                yield
+            finally:
+                control.release()
+    return admit
+
+admission_controls = {
+    "login": AdmissionControl("login", TokenBucket(LOGIN_RATE_LIMIT), None, AUTH_MAX_CONCURRENCY),
+    "register": AdmissionControl("register", TokenBucket(REGISTER_RATE_LIMIT), None, AUTH_MAX_CONCURRENCY),
+    "orders": AdmissionControl(
+        "orders", TokenBucket(ORDER_IP_RATE_LIMIT), TokenBucket(ORDER_USER_RATE_LIMIT), ORDER_MAX_CONCURRENCY
+    ),
+}
+
+login_admission = admission_dependency(admission_controls["login"])
+register_admission = admission_dependency(admission_controls["register"])
+order_admission = admission_dependency(admission_controls["orders"])
+
+def admission_snapshot() -> Dict[str, Any]:
+    return {route_class: control.snapshot() for route_class, control in admission_controls.items()}
+
+# Background refresh
+# In-memory state loaded from Supabase on first use and reloaded every ttl
+# seconds. Only the first load is awaited; once expired, the current contents
+# keep being served while a single background task reloads them, and a failed
+# reload is logged and retried by the next caller that finds them stale.
+class RefreshingState(ABC):
+    label = "State"
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.refresh_task: Optional[asyncio.Task] = None
+
+    @abstractmethod
+    async def load(self):
+        """Read everything from Supabase, swap it in and set loaded_at"""
+
+    def is_stale(self) -> bool:
+        return time.monotonic() - self.loaded_at >= self.ttl
+
+    async def refresh(self):
+        try:
+            async with self.lock:
+                if self.is_stale():
+                    await self.load()
+        except Exception as e:
+            logger.error(f"{self.label} refresh failed: {str(e)}")
+
+    async def ensure_fresh(self):
+        """Load on first use; afterwards refresh in the background and keep serving the current state"""
+        if not self.loaded_at:
+            async with self.lock:
+                if not self.loaded_at:
+                    await self.load()
+        elif self.is_stale() and (self.refresh_task is None or self.refresh_task.done()):
+            self.refresh_task = asyncio.create_task(self.refresh())
+
+# Admin user directory
+# An email -> user index built by paging through the auth admin API, so admin
+# lookups are a dict hit however many users exist. It is rebuilt every
+# USER_DIRECTORY_TTL seconds in the background; between rebuilds a lookup miss
+# pulls only the newest pages (the admin API lists newest users first).
+USER_DIRECTORY_TTL = float(os.getenv("USER_DIRECTORY_TTL", "3600"))
+USER_DIRECTORY_PAGE_SIZE = int(os.getenv("USER_DIRECTORY_PAGE_SIZE", "1000"))
+USER_DIRECTORY_CATCHUP_INTERVAL = float(os.getenv("USER_DIRECTORY_CATCHUP_INTERVAL", "5"))
+
+class UserDirectory(RefreshingState):
+    label = "User directory"
+
+    def __init__(self, ttl: float, page_size: int):
+        super().__init__(ttl)
+        self.page_size = page_size
+        self.by_email: Dict[str, Dict[str, Any]] = {}
+        self.caught_up_at = 0.0
+
+    @staticmethod
+    def entry(user) -> Dict[str, Any]:
+        created_at = getattr(user, "created_at", None)
+        return {
+            "id": user.id,
+            "email": user.email,
+            "role": (user.user_metadata or {}).get("role", "user"),
+            "created_at": created_at.isoformat() if isinstance(created_at, datetime) else created_at,
+        }
+
+    def add(self, user, by_email: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
+        """Index a user; returns True if it was not already indexed"""
+        if not user.email:
+            return False
+        by_email = self.by_email if by_email is None else by_email
+        key = user.email.lower()
+        is_new = key not in by_email or by_email[key]["id"] != user.id
+        by_email[key] = self.entry(user)
+        return is_new
+
+    async def fetch_page(self, page: int) -> List[Any]:
+        return await run_supabase("auth.list_users", supabase.auth.admin.list_users, page=page, per_page=self.page_size)
+
+    async def load(self):
+        by_email: Dict[str, Dict[str, Any]] = {}
+        page = 1
+        while True:
+            users = await self.fetch_page(page)
+            for user in users:
+                self.add(user, by_email)
+            if len(users) < self.page_size:
+                break
+            page += 1
+        self.by_email = by_email
+        self.loaded_at = self.caught_up_at = time.monotonic()
+
+    async def catch_up(self):
+        page = 1
+        while True:
+            users = await self.fetch_page(page)
+            added = [user for user in users if self.add(user)]
+            if not added or len(users) < self.page_size:
+                break
+            page += 1
+        self.caught_up_at = time.monotonic()
+
+    async def lookup(self, email: str) -> Optional[Dict[str, Any]]:
+        await self.ensure_fresh()
+        key = email.strip().lower()
+        if key not in self.by_email and time.monotonic() - self.caught_up_at >= USER_DIRECTORY_CATCHUP_INTERVAL:
+            async with self.lock:
+                if time.monotonic() - self.caught_up_at >= USER_DIRECTORY_CATCHUP_INTERVAL:
+                    await self.catch_up()
+        return self.by_email.get(key)
+
+user_directory = UserDirectory(USER_DIRECTORY_TTL, USER_DIRECTORY_PAGE_SIZE)
+
 # Auth routes
-@api_router.post("/auth/register")
+@api_router.post("/auth/register", dependencies=[Depends(register_admission)])
 async def register(user_data: UserRegister):
     try:
-        response = supabase.auth.sign_up({
+        response = await run_supabase("auth.sign_up", supabase.auth.sign_up, {
             "email": user_data.email,
             "password": user_data.password,
             "options": {
@@ -120,6 +1210,7 @@ async def register(user_data: UserRegister):
         })
         
         if response.user:
+            user_directory.add(response.user)
             return {
                 "message": "User registered successfully", 
                 "user": response.user,
@@ -127,6 +1218,8 @@ async def register(user_data: UserRegister):
             }
         else:
             raise HTTPException(status_code=400, detail="Registration failed")
+    except UpstreamError:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Registration error: {error_msg}")
@@ -134,10 +1227,10 @@ async def register(user_data: UserRegister):
             raise HTTPException(status_code=400, detail="Email already registered")
         raise HTTPException(status_code=400, detail=error_msg)
 
-@api_router.post("/auth/login")
+@api_router.post("/auth/login", dependencies=[Depends(login_admission)])
 async def login(credentials: UserLogin):
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await run_supabase("auth.sign_in", supabase.auth.sign_in_with_password, {
             "email": credentials.email,
             "password": credentials.password
         })
@@ -150,6 +1243,8 @@ async def login(credentials: UserLogin):
             "user": response.user,
             "role": response.user.user_metadata.get("role", "user")
         }
+    except UpstreamError:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"Login error: {error_msg}")
@@ -163,38 +1258,53 @@ async def login(credentials: UserLogin):
 async def set_user_as_admin(user_email: str, user: Dict = Depends(require_admin)):
     """Set a user's role to admin - only callable by existing admins"""
     try:
-        # Get all users from Supabase Auth admin API
-        # Note: This requires service role key which we have
-        users_response = supabase.auth.admin.list_users()
-        
-        target_user = None
-        for u in users_response:
-            if u.email == user_email:
-                target_user = u
-                break
+        # Resolve the user from the cached email index instead of listing users
+        target_user = await user_directory.lookup(user_email)
         
         if not target_user:
             raise HTTPException(status_code=404, detail="User not found")
         
         # Update user metadata to set role as admin
-        updated_user = supabase.auth.admin.update_user_by_id(
-            target_user.id,
+        updated_user = await run_supabase(
+            "auth.update_user",
+            supabase.auth.admin.update_user_by_id,
+            target_user["id"],
             {"user_metadata": {"role": "admin"}}
         )
+        if updated_user and updated_user.user:
+            user_directory.add(updated_user.user)
         
-        return {"message": f"User {user_email} is now an admin", "user_id": target_user.id}
+        return {"message": f"User {user_email} is now an admin", "user_id": target_user["id"]}
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Set admin error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/admin/users")
+async def find_user(email: EmailStr, user: Dict = Depends(require_admin)):
+    try:
+        found = await user_directory.lookup(email)
+        if not found:
+            raise HTTPException(status_code=404, detail="User not found")
+        return found
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 # Category routes
 @api_router.get("/categories")
-async def list_categories():
-    try:
-        response = supabase.table("categories").select("*").execute()
+async def list_categories(request: Request):
+    async def load():
+        response = await run_supabase("categories.select", supabase.table("categories").select("*").execute)
         return response.data
+
+    try:
+        entry = await catalog_cache.get_or_load(("categories",), load)
+        return conditional_response(request, entry, CATEGORIES_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -206,8 +1316,11 @@ async def create_category(category: CategoryBase, user: Dict = Depends(require_a
             **category.model_dump(),
             "created_at": datetime.utcnow().isoformat()
         }
-        response = supabase.table("categories").insert(data).execute()
+        response = await run_supabase("categories.insert", supabase.table("categories").insert(data).execute)
+        catalog_cache.invalidate(("categories",))
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -215,129 +1328,1251 @@ async def create_category(category: CategoryBase, user: Dict = Depends(require_a
 @api_router.put("/categories/{category_id}")
 async def update_category(category_id: str, category: CategoryBase, user: Dict = Depends(require_admin)):
     try:
-        response = supabase.table("categories").update(category.model_dump()).eq("id", category_id).execute()
+        response = await run_supabase("categories.update", supabase.table("categories").update(category.model_dump()).eq("id", category_id).execute)
+        catalog_cache.invalidate(("categories",))
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.delete("/categories/{category_id}")
 async def delete_category(category_id: str, user: Dict = Depends(require_admin)):
     try:
-        supabase.table("categories").delete().eq("id", category_id).execute()
+        await run_supabase("categories.delete", supabase.table("categories").delete().eq("id", category_id).execute)
+        catalog_cache.invalidate(("categories",))
         return {"message": "Category deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Catalog indexes
+# In-memory indexes over the whole products table. Each loads on first use, in
+# oldest-first keyset pages, and is rebuilt in a worker thread every ttl seconds
+# while the old one keeps serving; the product write routes patch them in place
+# in between. Patches made while a load is reading the table are journalled and
+# replayed onto the rebuilt index, so adopting it cannot undo them.
+CATALOG_INDEX_PAGE_SIZE = int(os.getenv("CATALOG_INDEX_PAGE_SIZE", "500"))
+
+class CatalogIndex(RefreshingState):
+    name = "catalog"
+    columns = "*"
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self.journal: Optional[List[tuple]] = None
+
+    @property
+    def label(self) -> str:
+        return f"{self.name} index"
+
+    @abstractmethod
+    def upsert(self, product: Dict[str, Any]):
+        """Index a product, replacing any earlier version of it"""
+
+    @abstractmethod
+    def remove(self, product_id: str):
+        """Drop a product from the index"""
+
+    @abstractmethod
+    def adopt(self, fresh: "CatalogIndex"):
+        """Take over the contents of a freshly rebuilt index"""
+
+    def mark_stale(self):
+        if self.loaded_at:
+            self.loaded_at = time.monotonic() - self.ttl
+
+    def write(self, method: str, *args):
+        """Apply a write route's change, journalling it while a load is reading the
+        table so it can be replayed onto the rebuilt index before it is adopted"""
+        if self.journal is not None:
+            self.journal.append((method, args))
+        getattr(self, method)(*args)
+
+    def rebuild(self, products: List[Dict[str, Any]]) -> "CatalogIndex":
+        fresh = type(self)(self.ttl)
+        for product in products:
+            fresh.upsert(product)
+        return fresh
+
+    async def load(self):
+        self.journal = []
+        try:
+            products = []
+            async for page in iter_keyset_pages(
+                f"products.{self.name}_index", lambda: supabase.table("products").select(self.columns), CATALOG_INDEX_PAGE_SIZE
+            ):
+                products.extend(page)
+            fresh = await asyncio.to_thread(self.rebuild, products)
+            # The pages may predate writes made while they were read; replay those on top
+            for method, args in self.journal:
+                getattr(fresh, method)(*args)
+            self.adopt(fresh)
+            self.loaded_at = time.monotonic()
+        finally:
+            self.journal = None
+
+# Product search
+# In-memory inverted index over name, tags, features and description, ranked
+# with BM25 using per-field weights. Each term's postings are growable arrays of
+# (position, weighted frequency); a query scores every posting of its terms in
+# one vectorised pass with the current average document length, so incremental
+# writes never leave stale scores behind. Removed postings are zeroed in place
+# and compacted by the periodic rebuild. Searches run in a worker thread and
+# share a mutex with the write routes.
+SEARCH_INDEX_TTL = float(os.getenv("SEARCH_INDEX_TTL", "300"))
+SEARCH_FIELD_WEIGHTS = {"name": 3.0, "tags": 2.0, "features": 1.5, "description": 1.0}
+SEARCH_STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "or", "the", "to", "with"}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in SEARCH_STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+def document_terms(product: Dict[str, Any]) -> Dict[str, float]:
+    """Weighted term frequencies for a product across the searchable fields"""
+    terms: Dict[str, float] = {}
+    for field, weight in SEARCH_FIELD_WEIGHTS.items():
+        value = product.get(field) or ""
+        text = " ".join(value) if isinstance(value, list) else str(value)
+        for token in tokenize(text):
+            terms[token] = terms.get(token, 0.0) + weight
+    return terms
+
+def grow(array: np.ndarray, size: int) -> np.ndarray:
+    """array itself if it can hold size entries, else a zero-padded copy at least twice as long"""
+    if size <= len(array):
+        return array
+    grown = np.zeros(max(size, 2 * len(array)), dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+class Postings:
+    __slots__ = ("positions", "frequencies", "size", "live", "impacts", "impacts_key")
+
+    def __init__(self):
+        self.positions = np.zeros(4, dtype=np.int64)
+        self.frequencies = np.zeros(4, dtype=np.float64)
+        self.size = 0
+        self.live = 0
+        self.impacts: Optional[np.ndarray] = None
+        self.impacts_key: Optional[tuple] = None
+
+    def add(self, position: int, frequency: float) -> int:
+        """Append a posting and return its slot"""
+        self.positions = grow(self.positions, self.size + 1)
+        self.frequencies = grow(self.frequencies, self.size + 1)
+        slot = self.size
+        self.positions[slot] = position
+        self.frequencies[slot] = frequency
+        self.size += 1
+        self.live += 1
+        return slot
+
+    def discard(self, slot: int):
+        self.frequencies[slot] = 0.0
+        self.live -= 1
+
+    def bm25_impacts(self, lengths: np.ndarray, average_length: float) -> np.ndarray:
+        """BM25 term weights (before idf) per slot, reused until the postings or the average length change"""
+        # Every add grows size and every discard lowers live, and a product's
+        # length only changes by re-adding it, so the key covers all inputs
+        key = (average_length, self.size, self.live)
+        if self.impacts_key != key:
+            frequencies = self.frequencies[:self.size]
+            norms = BM25_K1 * (1 - BM25_B + BM25_B * lengths[self.positions[:self.size]] / average_length)
+            self.impacts = frequencies * (BM25_K1 + 1) / (frequencies + norms)
+            self.impacts_key = key
+        return self.impacts
+
+class SearchIndex(CatalogIndex):
+    name = "search"
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self.mutex = threading.Lock()
+        self.products: List[Optional[Dict[str, Any]]] = []
+        self.positions: Dict[str, int] = {}
+        self.postings: Dict[str, Postings] = {}
+        self.doc_slots: Dict[int, Dict[str, int]] = {}
+        self.lengths = np.zeros(1024, dtype=np.float64)
+        self.categories = np.zeros(1024, dtype=np.int64)
+        self.category_codes: Dict[Any, int] = {}
+        self.total_length = 0.0
+
+    def upsert(self, product: Dict[str, Any]):
+        product_id = product.get("id")
+        if not product_id:
+            return
+        with self.mutex:
+            position = self.positions.get(product_id)
+            if position is None:
+                position = self.positions[product_id] = len(self.products)
+                self.products.append(None)
+                self.lengths = grow(self.lengths, len(self.products))
+                self.categories = grow(self.categories, len(self.products))
+            else:
+                self.unindex(position)
+            terms = document_terms(product)
+            self.products[position] = product
+            self.doc_slots[position] = {
+                term: self.postings.setdefault(term, Postings()).add(position, frequency)
+                for term, frequency in terms.items()
+            }
+            self.lengths[position] = length = sum(terms.values())
+            self.categories[position] = self.category_codes.setdefault(product.get("category_id"), len(self.category_codes))
+            self.total_length += length
+
+    def unindex(self, position: int):
+        for term, slot in self.doc_slots.pop(position, {}).items():
+            postings = self.postings[term]
+            postings.discard(slot)
+            if not postings.live:
+                del self.postings[term]
+        self.total_length -= self.lengths[position]
+        self.lengths[position] = 0.0
+
+    def remove(self, product_id: str):
+        with self.mutex:
+            position = self.positions.pop(product_id, None)
+            if position is not None:
+                self.unindex(position)
+                self.products[position] = None
+
+    def adopt(self, fresh: "SearchIndex"):
+        with self.mutex:
+            self.products, self.positions, self.postings, self.doc_slots = fresh.products, fresh.positions, fresh.postings, fresh.doc_slots
+            self.lengths, self.categories, self.category_codes = fresh.lengths, fresh.categories, fresh.category_codes
+            self.total_length = fresh.total_length
+
+    def search(self, query: str, category_id: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        with self.mutex:
+            terms = [term for term in set(tokenize(query)) if term in self.postings]
+            doc_count = len(self.positions)
+            if not terms:
+                return []
+
+            average_length = self.total_length / doc_count
+            size = len(self.products)
+            scores = np.zeros(size)
+            for term in terms:
+                postings = self.postings[term]
+                idf = math.log(1 + (doc_count - postings.live + 0.5) / (postings.live + 0.5))
+                impacts = postings.bm25_impacts(self.lengths, average_length)
+                # bincount sums duplicate positions, which zeroed slots of re-added products leave behind
+                scores += np.bincount(postings.positions[:postings.size], weights=idf * impacts, minlength=size)
+            if category_id:
+                scores[self.categories[:size] != self.category_codes.get(category_id, -1)] = 0.0
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > limit:
+                # Keep every product tied with the limit-th score so ties break by position
+                cutoff = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+                candidates = candidates[scores[candidates] >= cutoff]
+            ranked = candidates[np.lexsort((candidates, -scores[candidates]))][:limit]
+            return [{**self.products[position], "score": round(float(scores[position]), 4)} for position in ranked]
+
+search_index = SearchIndex(SEARCH_INDEX_TTL)
+
+# Product facets
+# One roaring bitmap per facet value (category, tag, featured, in stock, price
+# band) over product positions. Filters OR values within a facet and AND across
+# facets; counts for a facet apply every other facet's selection, so the UI can
+# show what each extra choice would return.
+FACET_INDEX_TTL = float(os.getenv("FACET_INDEX_TTL", "300"))
+PRICE_BAND_EDGES = [float(edge) for edge in os.getenv("PRICE_BAND_EDGES", "0,250,500,1000").split(",")]
+FACETS = ("category", "tag", "featured", "in_stock", "price")
+
+def price_band_label(price: Any) -> Optional[str]:
+    if price is None:
+        return None
+    price = float(price)
+    for low, high in zip(PRICE_BAND_EDGES, PRICE_BAND_EDGES[1:] + [None]):
+        if price >= low and (high is None or price < high):
+            return f"{low:g}-{high:g}" if high is not None else f"{low:g}+"
+    return None
+
+def product_facets(product: Dict[str, Any]) -> List[tuple]:
+    facets = [
+        ("category", product.get("category_id")),
+        ("featured", "true" if product.get("is_featured") else "false"),
+        ("in_stock", "true" if (product.get("stock") or 0) > 0 else "false"),
+        ("price", price_band_label(product.get("price"))),
+    ]
+    facets += [("tag", tag) for tag in product.get("tags") or []]
+    return [(facet, value) for facet, value in facets if value is not None]
+
+class FacetIndex(CatalogIndex):
+    name = "facet"
+    # Positions follow load (creation) order, so iterating a bitmap backwards yields newest first
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self.products: List[Optional[Dict[str, Any]]] = []
+        self.positions: Dict[str, int] = {}
+        self.doc_facets: Dict[int, List[tuple]] = {}
+        self.bitmaps: Dict[str, Dict[str, BitMap]] = {facet: {} for facet in FACETS}
+        self.live = BitMap()
+
+    def upsert(self, product: Dict[str, Any]):
+        product_id = product.get("id")
+        if not product_id:
+            return
+        position = self.positions.get(product_id)
+        if position is None:
+            position = self.positions[product_id] = len(self.products)
+            self.products.append(None)
+        else:
+            self.unindex(position)
+        self.products[position] = product
+        self.doc_facets[position] = facets = product_facets(product)
+        for facet, value in facets:
+            self.bitmaps[facet].setdefault(value, BitMap()).add(position)
+        self.live.add(position)
+
+    def unindex(self, position: int):
+        for facet, value in self.doc_facets.pop(position, []):
+            bitmap = self.bitmaps[facet][value]
+            bitmap.discard(position)
+            if not bitmap:
+                del self.bitmaps[facet][value]
+        self.live.discard(position)
+
+    def remove(self, product_id: str):
+        position = self.positions.pop(product_id, None)
+        if position is not None:
+            self.unindex(position)
+            self.products[position] = None
+
+    def set_stock(self, product_id: str, stock: int):
+        position = self.positions.get(product_id)
+        if position is not None:
+            self.upsert({**self.products[position], "stock": stock})
+
+    def adopt(self, fresh: "FacetIndex"):
+        self.products, self.positions, self.doc_facets = fresh.products, fresh.positions, fresh.doc_facets
+        self.bitmaps, self.live = fresh.bitmaps, fresh.live
+
+    def query(self, filters: Dict[str, List[str]], match_all_tags: bool = False) -> tuple:
+        """Return (matching positions, per-facet selections) for the given filters"""
+        selections = {}
+        for facet, values in filters.items():
+            bitmaps = [self.bitmaps[facet].get(value, BitMap()) for value in values]
+            if facet == "tag" and match_all_tags:
+                selections[facet] = BitMap.intersection(*bitmaps)
+            else:
+                selections[facet] = BitMap.union(BitMap(), *bitmaps)
+
+        matches = self.live.copy()
+        for selection in selections.values():
+            matches &= selection
+        return matches, selections
+
+    def counts(self, selections: Dict[str, BitMap]) -> Dict[str, Dict[str, int]]:
+        counts = {}
+        for facet in FACETS:
+            base = self.live.copy()
+            for other, selection in selections.items():
+                if other != facet:
+                    base &= selection
+            counts[facet] = {
+                value: count
+                for value, bitmap in self.bitmaps[facet].items()
+                if (count := base.intersection_cardinality(bitmap))
+            }
+        return counts
+
+    def rows(self, positions: BitMap, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ordered = reversed(positions.to_array()) if limit is None else reversed(positions[-limit:].to_array())
+        return [self.products[position] for position in ordered]
+
+facet_index = FacetIndex(FACET_INDEX_TTL)
+
 # Product routes  
-@api_router.get("/products")
-async def list_products(category_id: Optional[str] = None):
-    try:
-        query = supabase.table("products").select("*")
+@api_router.get("/products", response_model=Union[List[Product], FacetedProducts])
+async def list_products(
+    request: Request,
+    category_id: Optional[str] = None,
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    tags: Optional[str] = None,
+    tag_mode: str = Query("any", pattern="^(any|all)$"),
+    featured: Optional[bool] = None,
+    in_stock: Optional[bool] = None,
+    price_band: Optional[str] = None,
+    facets: bool = False
+):
+    filters = {
+        "category": split_values(category_id),
+        "tag": split_values(tags),
+        "featured": [str(featured).lower()] if featured is not None else [],
+        "in_stock": [str(in_stock).lower()] if in_stock is not None else [],
+        "price": split_values(price_band),
+    }
+    filters = {facet: values for facet, values in filters.items() if values}
+    if facets or set(filters) - {"category"} or len(filters.get("category", [])) > 1:
+        if cursor is not None:
+            raise HTTPException(status_code=400, detail="cursor cannot be combined with facet filters")
+        columns = parse_fields(fields, PRODUCT_COLUMNS, PRODUCT_VIEWS)
+        return await list_products_faceted(filters, tag_mode == "all", columns, limit, facets)
+
+    if limit is not None or cursor is not None:
+        columns = parse_fields(fields, PRODUCT_COLUMNS, PRODUCT_VIEWS, required=("id", "created_at"))
+        return await list_products_page(category_id, columns, limit or DEFAULT_PAGE_SIZE, cursor)
+
+    columns = parse_fields(fields, PRODUCT_COLUMNS, PRODUCT_VIEWS)
+
+    async def load():
+        query = supabase.table("products").select(select_columns(columns))
         if category_id:
             query = query.eq("category_id", category_id)
-        response = query.execute()
+        response = await run_supabase("products.select", query.execute)
         return response.data
+
+    try:
+        entry = await catalog_cache.get_or_load(("products", category_id or None, columns), load)
+        return conditional_response(request, entry, PRODUCTS_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/products/{product_id}")
-async def get_product(product_id: str):
+def split_values(value: Optional[str]) -> List[str]:
+    return [item.strip() for item in (value or "").split(",") if item.strip()]
+
+async def list_products_faceted(
+    filters: Dict[str, List[str]],
+    match_all_tags: bool,
+    columns: Optional[tuple],
+    limit: Optional[int],
+    with_counts: bool
+):
     try:
-        response = supabase.table("products").select("*").eq("id", product_id).execute()
-        if not response.data:
-            raise HTTPException(status_code=404, detail="Product not found")
-        return response.data[0]
+        await facet_index.ensure_fresh()
+        matches, selections = facet_index.query(filters, match_all_tags)
+        products = facet_index.rows(matches, limit)
+        if columns:
+            products = [{column: product.get(column) for column in columns} for product in products]
+        if not with_counts:
+            return ORJSONResponse(products)
+        return ORJSONResponse({"total": len(matches), "products": products, "facets": facet_index.counts(selections)})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/products")
-async def create_product(product: ProductBase, user: Dict = Depends(require_admin)):
+async def list_products_page(category_id: Optional[str], columns: Optional[tuple], limit: int, cursor: Optional[str]):
+    query = supabase.table("products").select(select_columns(columns))
+    if category_id:
+        query = query.eq("category_id", category_id)
+    query = apply_keyset(query, limit, cursor)
     try:
-        data = {
-            **product.model_dump(),
-            "created_at": datetime.utcnow().isoformat()
-        }
-        response = supabase.table("products").insert(data).execute()
-        return response.data[0] if response.data else {}
+        response = await run_supabase("products.select_page", query.execute)
+        return paginated_response(response.data, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.put("/products/{product_id}")
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100"))
+
+async def get_products_batch(ids: List[str]) -> ORJSONResponse:
+    """Resolve ids from the per-product cache entries, fetching the misses in one in_ query"""
+    ids = list(dict.fromkeys(product_id.strip() for product_id in ids if product_id.strip()))
+    if len(ids) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} ids per batch")
+
+    found: Dict[str, Dict[str, Any]] = {}
+    to_fetch = []
+    for product_id in ids:
+        entry = catalog_cache.lookup(("product", product_id))
+        if entry is None:
+            to_fetch.append(product_id)
+        elif entry is not NOT_FOUND:
+            found[product_id] = entry.data
+
+    valid_ids = []
+    for product_id in to_fetch:
+        try:
+            uuid.UUID(product_id)
+            valid_ids.append(product_id)
+        except ValueError:
+            pass
+
+    if valid_ids:
+        version = catalog_cache.version
+        response = await run_supabase(
+            "products.batch",
+            supabase.table("products").select("*").in_("id", valid_ids).execute
+        )
+        fetched = {row["id"]: row for row in response.data}
+        for product_id in valid_ids:
+            row = fetched.get(product_id, NOT_FOUND)
+            catalog_cache.store(("product", product_id), row, version)
+            if row is not NOT_FOUND:
+                found[product_id] = row
+
+    return ORJSONResponse({
+        "products": [found[product_id] for product_id in ids if product_id in found],
+        "missing": [product_id for product_id in ids if product_id not in found]
+    })
+
+@api_router.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch_by_query(ids: str = ""):
+    try:
+        return await get_products_batch(ids.split(","))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/products/batch", response_model=ProductBatch)
+async def get_products_batch_by_body(batch: ProductBatchRequest):
+    try:
+        return await get_products_batch(batch.ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/products/search")
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    category_id: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=MAX_PAGE_SIZE)
+):
+    try:
+        await search_index.ensure_fresh()
+        results = await asyncio.to_thread(search_index.search, q, category_id, limit)
+        return ORJSONResponse({"query": q, "results": results})
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/products/{product_id}", response_model=Product)
+async def get_product(product_id: str, request: Request):
+    async def load():
+        response = await run_supabase("products.get", supabase.table("products").select("*").eq("id", product_id).execute)
+        return response.data[0] if response.data else NOT_FOUND
+
+    try:
+        entry = await catalog_cache.get_or_load(("product", product_id), load)
+        if entry is NOT_FOUND:
+            raise HTTPException(status_code=404, detail="Product not found")
+        return conditional_response(request, entry, PRODUCTS_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/products")
+async def create_product(product: ProductBase, user: Dict = Depends(require_admin)):
+    try:
+        created_at = datetime.utcnow().isoformat()
+        data = {
+            **product.model_dump(),
+            "created_at": created_at,
+            "updated_at": created_at
+        }
+        response = await run_supabase("products.insert", supabase.table("products").insert(data).execute)
+        created = response.data[0] if response.data else {}
+        catalog_cache.invalidate_product(created.get("id"), product.category_id)
+        price_index.write("upsert", created)
+        search_index.write("upsert", created)
+        facet_index.write("upsert", created)
+        return created
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.put("/products/{product_id}")
 async def update_product(product_id: str, product: ProductBase, user: Dict = Depends(require_admin)):
     try:
-        response = supabase.table("products").update(product.model_dump()).eq("id", product_id).execute()
+        data = {**product.model_dump(), "updated_at": datetime.utcnow().isoformat()}
+        response = await run_supabase("products.update", supabase.table("products").update(data).eq("id", product_id).execute)
+        catalog_cache.invalidate_product(product_id, product.category_id)
+        if response.data:
+            price_index.write("upsert", response.data[0])
+            search_index.write("upsert", response.data[0])
+            facet_index.write("upsert", response.data[0])
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, user: Dict = Depends(require_admin)):
     try:
-        supabase.table("products").delete().eq("id", product_id).execute()
+        await run_supabase("products.delete", supabase.table("products").delete().eq("id", product_id).execute)
+        catalog_cache.invalidate_product(product_id)
+        price_index.write("remove", product_id)
+        search_index.write("remove", product_id)
+        facet_index.write("remove", product_id)
         return {"message": "Product deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# Image upload
-@api_router.post("/upload")
-async def upload_image(file: UploadFile = File(...), user: Dict = Depends(require_admin)):
+# Bulk product import
+# Rows are parsed and validated in a worker thread straight from the spooled
+# upload, category names are resolved from the cached category list, and valid
+# rows are written in BULK_IMPORT_BATCH_SIZE batches with a few batches in flight.
+# Rows without an id are inserted; rows with one are upserted with only the
+# columns the file provides, so a partial re-import leaves the others alone.
+BULK_IMPORT_BATCH_SIZE = int(os.getenv("BULK_IMPORT_BATCH_SIZE", "500"))
+BULK_IMPORT_CONCURRENCY = int(os.getenv("BULK_IMPORT_CONCURRENCY", "4"))
+BULK_IMPORT_MAX_ERRORS = int(os.getenv("BULK_IMPORT_MAX_ERRORS", "1000"))
+BULK_LIST_SEPARATOR = "|"
+
+def bulk_import_format(file: UploadFile, format: Optional[str]) -> str:
+    if format:
+        return format
+    name = (file.filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or (file.content_type or "").endswith("ndjson"):
+        return "jsonl"
+    return "csv"
+
+def read_bulk_records(file: UploadFile, format: str):
+    """Yield (line, raw record) pairs; a raw record is None when the line could not be parsed"""
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        reader = csv.DictReader(text)
+        columns = {key.strip() for key in reader.fieldnames or [] if key}
+        for row in reader:
+            record = {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+            for field in ("features", "tags"):
+                # Rows updating an existing product leave list columns missing from the file untouched
+                if field in columns or "id" not in record:
+                    values = record.get(field, "").split(BULK_LIST_SEPARATOR)
+                    record[field] = [value.strip() for value in values if value.strip()]
+            yield reader.line_num, record
+        return
+
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_number, None
+            continue
+        yield line_number, record if isinstance(record, dict) else None
+
+def validate_bulk_records(records, category_ids: Dict[str, str]):
+    """Yield (line, product row, error) for each record, resolving category names to ids"""
+    for line_number, record in records:
+        if record is None:
+            yield line_number, None, "Could not parse row"
+            continue
+        category = record.pop("category", None)
+        if category and not record.get("category_id"):
+            category_id = category_ids.get(str(category).strip().lower())
+            if not category_id:
+                yield line_number, None, f"Unknown category: {category}"
+                continue
+            record["category_id"] = category_id
+
+        product_id = record.pop("id", None)
+        try:
+            # Rows with an id only carry the columns they set, so an upsert keeps the rest of the stored row
+            row = ProductBase.model_validate(record).model_dump(exclude_unset=bool(product_id))
+            if product_id:
+                row["id"] = str(uuid.UUID(str(product_id)))
+        except ValidationError as e:
+            yield line_number, None, "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+            continue
+        except ValueError:
+            yield line_number, None, f"Invalid id: {product_id}"
+            continue
+        yield line_number, row, None
+
+async def write_product_batch(batch: List[tuple]) -> Optional[str]:
+    """Insert new rows and upsert rows carrying an id; returns an error message on failure"""
+    created_at = datetime.utcnow().isoformat()
+    inserts = [{**row, "created_at": created_at, "updated_at": created_at} for _, row in batch if "id" not in row]
+    # A bulk upsert needs every object to carry the same keys, so send one per column set
+    upserts: Dict[frozenset, List[Dict[str, Any]]] = {}
+    for _, row in batch:
+        if "id" in row:
+            upserts.setdefault(frozenset(row), []).append({**row, "updated_at": created_at})
     try:
-        # Generate unique filename
-        file_ext = file.filename.split('.')[-1] if '.' in file.filename else 'jpg'
-        file_name = f"products/{uuid.uuid4().hex}_{int(datetime.utcnow().timestamp())}.{file_ext}"
-        
-        # Read file content
-        content = await file.read()
-        
-        # Upload to Supabase storage
-        response = supabase.storage.from_('product-images').upload(
+        if inserts:
+            await run_supabase(
+                "products.bulk_insert",
+                supabase.table("products").insert(inserts, returning=ReturnMethod.minimal).execute
+            )
+        for rows in upserts.values():
+            await run_supabase(
+                "products.bulk_upsert",
+                supabase.table("products").upsert(rows, returning=ReturnMethod.minimal).execute
+            )
+        return None
+    except Exception as e:
+        return str(e)
+
+@api_router.post("/admin/products/bulk")
+async def bulk_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    batch_size: int = Query(BULK_IMPORT_BATCH_SIZE, ge=1, le=5000),
+    dry_run: bool = False,
+    user: Dict = Depends(require_admin)
+):
+    async def load_categories():
+        response = await run_supabase("categories.select", supabase.table("categories").select("*").execute)
+        return response.data
+
+    try:
+        categories = await catalog_cache.get_or_load(("categories",), load_categories)
+        category_ids = {category["name"].strip().lower(): category["id"] for category in categories.data}
+        rows = validate_bulk_records(read_bulk_records(file, bulk_import_format(file, format)), category_ids)
+
+        report = {"received": 0, "imported": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+        def add_error(line_number: int, error: str):
+            report["failed"] += 1
+            if len(report["errors"]) < BULK_IMPORT_MAX_ERRORS:
+                report["errors"].append({"line": line_number, "error": error})
+            else:
+                report["errors_truncated"] = True
+
+        async def flush(batch: List[tuple]):
+            error = await write_product_batch(batch)
+            if error:
+                for line_number, _ in batch:
+                    add_error(line_number, error)
+            else:
+                report["imported"] += len(batch)
+
+        in_flight = set()
+        while True:
+            chunk = await asyncio.to_thread(lambda: list(itertools.islice(rows, batch_size)))
+            if not chunk:
+                break
+            batch = []
+            for line_number, row, error in chunk:
+                report["received"] += 1
+                if error:
+                    add_error(line_number, error)
+                else:
+                    batch.append((line_number, row))
+            if dry_run or not batch:
+                continue
+            if len(in_flight) >= BULK_IMPORT_CONCURRENCY:
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            in_flight.add(asyncio.create_task(flush(batch)))
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        if report["imported"]:
+            catalog_cache.invalidate_products()
+            price_index.mark_stale()
+            search_index.mark_stale()
+            facet_index.mark_stale()
+        return report
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk import error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Image upload
+# Starlette spools multipart files to a temp file past 1 MB, so uploads never
+# sit whole in worker memory. UploadSizeLimitMiddleware caps the body before it
+# is parsed, the type is sniffed from the first bytes, and the storage push
+# streams from a staged temp file on the offload pool.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+UPLOAD_SNIFF_BYTES = 16
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png", "png"),
+    (b"GIF87a", "image/gif", "gif"),
+    (b"GIF89a", "image/gif", "gif"),
+]
+
+def sniff_image_type(header: bytes) -> Optional[tuple]:
+    for signature, content_type, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type, extension
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp", "webp"
+    return None
+
+class UploadSizeLimitMiddleware:
+    """Reject request bodies over a per-path byte limit before they are parsed"""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = ORJSONResponse({"detail": f"Upload exceeds {limit} bytes"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=f"Upload exceeds {limit} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def push_upload(file_name: str, source_path: str, content_type: str):
+    # A BufferedReader lets the storage client stream the file instead of
+    # reading it into bytes first.
+    with open(source_path, "rb") as stream:
+        return supabase.storage.from_(IMAGE_BUCKET).upload(
             file_name,
+            stream,
+            file_options={"content-type": content_type, "upsert": "true"}
+        )
+
+def stage_upload(spooled) -> tuple:
+    """Copy the spooled upload to a named temp file the image workers can open,
+    hashing it on the way; returns (path, sha256 hex digest, size)"""
+    spooled.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False) as staged:
+        while True:
+            chunk = spooled.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            staged.write(chunk)
+            size += len(chunk)
+    return staged.name, digest.hexdigest(), size
+
+# Image variants
+# Each upload is re-encoded at IMAGE_VARIANT_WIDTHS in its own format plus WebP
+# by a process pool, and stored next to the original as {stem}_{width}.{ext}.
+# Images narrower than a width are stored at their own size under that name,
+# so every image has the same predictable set of variant names.
+IMAGE_BUCKET = "product-images"
+IMAGE_VARIANT_WIDTHS = [int(width) for width in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",")]
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+VARIANT_FORMATS = {
+    "jpg": ("JPEG", "image/jpeg"),
+    "png": ("PNG", "image/png"),
+    "webp": ("WEBP", "image/webp"),
+}
+
+# Workers are started from a clean forkserver (spawn where it is unavailable):
+# forking the server itself would copy its offload threads' held locks into
+# the child, where nothing can ever release them.
+IMAGE_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+image_executor = ProcessPoolExecutor(
+    max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context(IMAGE_START_METHOD)
+)
+
+def variant_extensions(extension: str) -> List[str]:
+    return [extension, "webp"] if extension in ("jpg", "png") else ["webp"]
+
+def image_width(source_path: str) -> int:
+    """Display width from the image header, honouring EXIF rotation"""
+    with Image.open(source_path) as image:
+        width, height = image.size
+        return height if image.getexif().get(0x0112) in (5, 6, 7, 8) else width
+
+def render_variants(source_path: str, extension: str, widths: List[int]) -> List[tuple]:
+    """Return (width, actual width, extension, bytes) for every variant; runs in the image pool"""
+    with Image.open(source_path) as original:
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    encoded: Dict[tuple, bytes] = {}
+    variants = []
+    for width in widths:
+        actual_width = min(width, image.width)
+        for variant_extension in variant_extensions(extension):
+            key = (actual_width, variant_extension)
+            if key not in encoded:
+                resized = image.resize((actual_width, max(1, round(image.height * actual_width / image.width))), Image.LANCZOS)
+                image_format = VARIANT_FORMATS[variant_extension][0]
+                if image_format == "JPEG":
+                    resized = resized.convert("RGB")
+                elif image_format == "WEBP" and resized.mode not in ("RGB", "RGBA"):
+                    resized = resized.convert("RGBA")
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, quality=IMAGE_VARIANT_QUALITY, optimize=True)
+                encoded[key] = buffer.getvalue()
+            variants.append((width, actual_width, variant_extension, encoded[key]))
+    return variants
+
+def variant_name(file_name: str, width: int, extension: str) -> str:
+    return f"{file_name.rsplit('.', 1)[0]}_{width}.{extension}"
+
+async def store_variants(file_name: str, source_path: str, extension: str) -> Dict[str, Any]:
+    """Render and upload every variant of an image, returning URLs and srcset strings"""
+    rendered = await asyncio.get_running_loop().run_in_executor(
+        image_executor, render_variants, source_path, extension, IMAGE_VARIANT_WIDTHS
+    )
+    bucket = supabase.storage.from_(IMAGE_BUCKET)
+    names = [variant_name(file_name, width, variant_extension) for width, _, variant_extension, _ in rendered]
+    await asyncio.gather(*[
+        run_supabase(
+            "storage.upload",
+            bucket.upload,
+            name,
             content,
-            file_options={"content-type": file.content_type}
+            file_options={"content-type": VARIANT_FORMATS[variant_extension][1], "upsert": "true"}
         )
-        
+        for name, (_, _, variant_extension, content) in zip(names, rendered)
+    ])
+
+    return describe_variants(file_name, [variant[:3] for variant in rendered])
+
+def describe_variants(file_name: str, layout: List[tuple]) -> Dict[str, Any]:
+    """Variant URLs and srcset strings for (width, actual width, extension) entries"""
+    bucket = supabase.storage.from_(IMAGE_BUCKET)
+    variants: Dict[str, Dict[str, str]] = {}
+    srcset: Dict[str, Dict[int, str]] = {}
+    for width, actual_width, variant_extension in layout:
+        content_type = VARIANT_FORMATS[variant_extension][1]
+        url = bucket.get_public_url(variant_name(file_name, width, variant_extension))
+        variants.setdefault(content_type, {})[str(width)] = url
+        srcset.setdefault(content_type, {}).setdefault(actual_width, f"{url} {actual_width}w")
+    return {
+        "variants": variants,
+        "srcset": {content_type: ", ".join(entries.values()) for content_type, entries in srcset.items()}
+    }
+
+# Upload deduplication
+# Uploads are content-addressed as products/{sha256}.{ext}. The digest -> response
+# index answers repeat uploads without a storage write; on an index miss the
+# bucket is searched for the digest so duplicates survive restarts.
+UPLOAD_INDEX_SIZE = int(os.getenv("UPLOAD_INDEX_SIZE", "10000"))
+
+class UploadIndex:
+    def __init__(self, maxsize: int):
+        self.entries = LRUCache(maxsize=maxsize)
+        self.stats = {"uploads": 0, "duplicates": 0, "bytes_stored": 0, "bytes_saved": 0}
+
+    async def lookup(self, digest: str, file_name: str, source_path: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(digest)
+        if entry is not None:
+            return entry
+
+        folder, name = file_name.rsplit("/", 1)
+        bucket = supabase.storage.from_(IMAGE_BUCKET)
+        objects = await run_supabase("storage.list", bucket.list, folder, {"search": digest})
+        # The original is written last, but an upload that predates that (or a
+        # changed IMAGE_VARIANT_WIDTHS) can still leave variants missing
+        extension = name.rsplit(".", 1)[1]
+        expected = {name} | {
+            variant_name(name, requested, variant_extension)
+            for requested in IMAGE_VARIANT_WIDTHS
+            for variant_extension in variant_extensions(extension)
+        }
+        if not expected <= {obj.get("name") for obj in objects}:
+            return None
+
+        width = await asyncio.to_thread(image_width, source_path)
+        layout = [
+            (requested, min(requested, width), variant_extension)
+            for requested in IMAGE_VARIANT_WIDTHS
+            for variant_extension in variant_extensions(extension)
+        ]
+        entry = {"url": bucket.get_public_url(file_name), **describe_variants(file_name, layout)}
+        self.entries[digest] = entry
+        return entry
+
+    def store(self, digest: str, entry: Dict[str, Any], size: int):
+        self.entries[digest] = entry
+        self.stats["uploads"] += 1
+        self.stats["bytes_stored"] += size
+
+    def record_duplicate(self, size: int):
+        self.stats["duplicates"] += 1
+        self.stats["bytes_saved"] += size
+
+    def snapshot(self) -> Dict[str, Any]:
+        total = self.stats["uploads"] + self.stats["duplicates"]
+        return {
+            **self.stats,
+            "indexed": len(self.entries),
+            "duplicate_rate": round(self.stats["duplicates"] / total, 4) if total else 0.0
+        }
+
+upload_index = UploadIndex(UPLOAD_INDEX_SIZE)
+
+@api_router.get("/admin/uploads/stats")
+async def upload_stats(user: Dict = Depends(require_admin)):
+    return upload_index.snapshot()
+
+@api_router.post("/upload")
+async def upload_image(file: UploadFile = File(...), user: Dict = Depends(require_admin)):
+    staged_path = None
+    try:
+        if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+            raise HTTPException(status_code=413, detail=f"Upload exceeds {UPLOAD_MAX_BYTES} bytes")
+
+        # Sniff the real image type instead of trusting the client
+        sniffed = sniff_image_type(await file.read(UPLOAD_SNIFF_BYTES))
+        if not sniffed:
+            raise HTTPException(status_code=415, detail="Unsupported image type")
+        content_type, file_ext = sniffed
+
+        # Name the file after its content so repeat uploads map to one object
+        staged_path, digest, size = await asyncio.to_thread(stage_upload, file.file)
+        file_name = f"products/{digest}.{file_ext}"
+
+        existing = await upload_index.lookup(digest, file_name, staged_path)
+        if existing:
+            upload_index.record_duplicate(size)
+            return {"success": True, **existing, "duplicate": True}
+
+        # Upload the original only once every variant is stored: its presence in
+        # the bucket is what marks the upload complete for later lookups
+        variants = await store_variants(file_name, staged_path, file_ext)
+        await run_supabase("storage.upload", push_upload, file_name, staged_path, content_type)
+
         # Get public URL
-        public_url = supabase.storage.from_('product-images').get_public_url(file_name)
-        
-        return {"success": True, "url": public_url}
+        public_url = supabase.storage.from_(IMAGE_BUCKET).get_public_url(file_name)
+        entry = {"url": public_url, **variants}
+        upload_index.store(digest, entry, size)
+
+        return {"success": True, **entry, "duplicate": False}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if staged_path:
+            os.unlink(staged_path)
+
+# Order pricing
+# Orders are priced on the server from an in-memory id -> (price, stock, name)
+# catalog index. It is rebuilt in the background every PRICE_INDEX_TTL seconds
+# and patched in place by the product write routes, so quoting needs no per-item
+# I/O and never waits on a reload.
+PRICE_INDEX_TTL = float(os.getenv("PRICE_INDEX_TTL", "60"))
+DELIVERY_CHARGES = {
+    "within-delhi": 50,
+    "ncr": 70,
+    "outside-ncr": 90,
+}
+
+class PriceIndex(CatalogIndex):
+    name = "price"
+    columns = "id,name,price,stock,created_at"
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self.products: Dict[str, tuple] = {}
+
+    def upsert(self, row: Dict[str, Any]):
+        if row.get("id"):
+            self.products[row["id"]] = (float(row["price"]), int(row.get("stock") or 0), row["name"])
+
+    def remove(self, product_id: str):
+        self.products.pop(product_id, None)
+
+    def set_stock(self, product_id: str, stock: int):
+        if product_id in self.products:
+            price, _, name = self.products[product_id]
+            self.products[product_id] = (price, stock, name)
+
+    def adopt(self, fresh: "PriceIndex"):
+        self.products = fresh.products
+
+    async def load_missing(self, product_ids: List[str]):
+        """Fetch ids the index has not seen yet (e.g. created on another worker) in one query"""
+        valid_ids = []
+        for product_id in product_ids:
+            try:
+                valid_ids.append(str(uuid.UUID(product_id)))
+            except ValueError:
+                pass
+        if not valid_ids:
+            return
+        response = await run_supabase(
+            "products.price_index",
+            supabase.table("products").select("id,name,price,stock").in_("id", valid_ids).execute
+        )
+        for row in response.data:
+            self.write("upsert", row)
+
+    async def quote(self, items: List[Any], delivery_type: Optional[str]) -> Dict[str, Any]:
+        await self.ensure_fresh()
+        missing = [item.product_id for item in items if item.product_id not in self.products]
+        if missing:
+            await self.load_missing(missing)
+
+        lines = []
+        errors = []
+        subtotal = 0.0
+        for item in items:
+            product = self.products.get(item.product_id)
+            if product is None:
+                errors.append({"product_id": item.product_id, "code": "not_found", "error": "Product not found"})
+                continue
+            price, stock, name = product
+            if item.quantity <= 0:
+                errors.append({"product_id": item.product_id, "code": "invalid_quantity", "error": "Quantity must be positive"})
+                continue
+            if item.quantity > stock:
+                errors.append({"product_id": item.product_id, "code": "insufficient_stock", "error": f"Only {stock} in stock"})
+            line_total = round(price * item.quantity, 2)
+            subtotal += line_total
+            lines.append({
+                "product_id": item.product_id,
+                "product_name": name,
+                "quantity": item.quantity,
+                "price": price,
+                "line_total": line_total
+            })
+
+        if not items:
+            errors.append({"code": "empty_order", "error": "Order has no items"})
+        if delivery_type is None:
+            delivery_charge = 0
+        elif delivery_type in DELIVERY_CHARGES:
+            delivery_charge = DELIVERY_CHARGES[delivery_type]
+        else:
+            delivery_charge = 0
+            errors.append({"delivery_type": delivery_type, "code": "unknown_delivery_type", "error": "Unknown delivery type"})
+
+        subtotal = round(subtotal, 2)
+        return {
+            "items": lines,
+            "subtotal": subtotal,
+            "delivery_type": delivery_type,
+            "delivery_charge": delivery_charge,
+            "total_amount": round(subtotal + delivery_charge, 2),
+            "errors": errors
+        }
+
+price_index = PriceIndex(PRICE_INDEX_TTL)
+
+# Order placement
+# Orders are stored by a single place_order RPC (see add_stock_reservation.sql),
+# which reserves every line with reserve_stock and inserts the order row in one
+# transaction, failing the whole call if any product is short. A timeout can
+# leave the outcome unknown, but never stock taken without an order or the reverse.
+def apply_stock_levels(rows: List[Dict[str, Any]]):
+    for row in rows:
+        price_index.write("set_stock", row["product_id"], row["stock"])
+        facet_index.write("set_stock", row["product_id"], row["stock"])
+    catalog_cache.invalidate(*[("product", row["product_id"]) for row in rows])
+
+async def place_order(data: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        response = await run_supabase("rpc.place_order", supabase.rpc("place_order", {"new_order": data}).execute)
+    except APIError as e:
+        if e.message == "insufficient_stock":
+            short_ids = [product_id for product_id in (e.details or "").split(",") if product_id]
+            for product_id in short_ids:
+                price_index.write("set_stock", product_id, 0)
+            raise HTTPException(status_code=409, detail={"error": "Insufficient stock", "product_ids": short_ids})
+        raise
+    placed = response.data or {}
+    apply_stock_levels(placed.get("stock") or [])
+    return placed.get("order") or {}
 
 # Order routes
-@api_router.get("/orders")
-async def list_orders(user: Dict = Depends(get_current_user)):
+@api_router.post("/orders/quote")
+async def quote_order(quote_request: OrderQuoteRequest):
     try:
-        query = supabase.table("orders").select("*")
-        if user["role"] != "admin":
-            query = query.eq("user_id", user["id"])
-        response = query.execute()
-        return response.data
+        return await price_index.quote(quote_request.items, quote_request.delivery_type)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/orders", response_model=List[Order])
+async def list_orders(
+    fields: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    user: Dict = Depends(get_current_user)
+):
+    paginated = limit is not None or cursor is not None
+    columns = parse_fields(fields, ORDER_COLUMNS, ORDER_VIEWS, required=("id", "created_at") if paginated else ("id",))
+    query = supabase.table("orders").select(select_columns(columns))
+    if user["role"] != "admin":
+        query = query.eq("user_id", user["id"])
+    if paginated:
+        limit = limit or DEFAULT_PAGE_SIZE
+        query = apply_keyset(query, limit, cursor)
+    try:
+        response = await run_supabase("orders.select", query.execute)
+        if paginated:
+            return paginated_response(response.data, limit)
+        return ORJSONResponse(response.data)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/orders")
+@api_router.post("/orders", dependencies=[Depends(order_admission)])
 async def create_order(order: OrderBase, user: Dict = Depends(get_current_user)):
     try:
+        # Prices, line items and totals come from the server-side quote, not the client
+        quote = await price_index.quote(order.items, order.delivery_type)
+        # Stock is checked authoritatively by place_order, not the cached index
+        errors = [error for error in quote["errors"] if error["code"] != "insufficient_stock"]
+        if errors:
+            raise HTTPException(status_code=400, detail=errors)
+        if abs(quote["total_amount"] - order.total_amount) > 0.01:
+            logger.warning(f"Order total mismatch for {user['id']}: client {order.total_amount}, server {quote['total_amount']}")
+
         # Build order data with all fields including customer details
         data = {
             "user_id": user["id"],
             "user_email": user["email"],
-            "items": [item.model_dump() for item in order.items],
-            "total_amount": order.total_amount,
+            "items": [
+                {key: line[key] for key in ("product_id", "product_name", "quantity", "price")}
+                for line in quote["items"]
+            ],
+            "total_amount": quote["total_amount"],
             "payment_status": order.payment_status,
             "delivery_status": order.delivery_status,
             "customer_name": order.customer_name,
             "customer_phone": order.customer_phone,
             "customer_address": order.customer_address,
-            "delivery_charge": order.delivery_charge or 0,
+            "delivery_charge": quote["delivery_charge"],
             "delivery_type": order.delivery_type,
             "created_at": datetime.utcnow().isoformat()
         }
             
         logger.info(f"Creating order with data: {data}")
-        response = supabase.table("orders").insert(data).execute()
-        return response.data[0] if response.data else {}
+        created = await place_order(data)
+        if created:
+            order_stats.record(created)
+        return created
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Order creation error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -356,25 +2591,378 @@ async def update_order_status(
         if delivery_status:
             update_data["delivery_status"] = delivery_status
         
-        response = supabase.table("orders").update(update_data).eq("id", order_id).execute()
+        previous = await run_supabase(
+            "orders.get_status",
+            supabase.table("orders").select("id,payment_status,delivery_status").eq("id", order_id).execute
+        )
+        response = await run_supabase("orders.update", supabase.table("orders").update(update_data).eq("id", order_id).execute)
+        if previous.data and response.data:
+            order_stats.record_status_change(previous.data[0], response.data[0])
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.delete("/orders/{order_id}")
 async def delete_order(order_id: str, user: Dict = Depends(require_admin)):
     try:
-        response = supabase.table("orders").delete().eq("id", order_id).execute()
+        response = await run_supabase("orders.delete", supabase.table("orders").delete().eq("id", order_id).execute)
+        for order in response.data or []:
+            order_stats.record(order, -1)
         return {"message": "Order deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk order status
+# Dispatch runs move many orders at once: targets are read in keyset pages,
+# checked against the allowed transitions, then updated with one in_() update
+# per current (payment, delivery) status pair. Each update is also filtered on
+# that pair, so orders changed concurrently are reported as conflicts.
+BULK_STATUS_MAX_ORDERS = int(os.getenv("BULK_STATUS_MAX_ORDERS", "2000"))
+BULK_STATUS_CHUNK_SIZE = int(os.getenv("BULK_STATUS_CHUNK_SIZE", "200"))
+PAYMENT_TRANSITIONS = {"Pending": {"Paid"}, "Paid": set()}
+DELIVERY_FLOW = ["Order Placed", "Packed", "Shipped", "Delivered"]
+STATUS_COLUMNS = "id,created_at,payment_status,delivery_status"
+
+def status_transition_error(order: Dict[str, Any], payment_status: Optional[str], delivery_status: Optional[str]) -> Optional[str]:
+    current = order.get("payment_status")
+    if payment_status and payment_status != current and payment_status not in PAYMENT_TRANSITIONS.get(current, set()):
+        return f"payment_status cannot move from {current} to {payment_status}"
+    current = order.get("delivery_status")
+    if delivery_status and delivery_status != current:
+        if current not in DELIVERY_FLOW or DELIVERY_FLOW.index(delivery_status) < DELIVERY_FLOW.index(current):
+            return f"delivery_status cannot move from {current} to {delivery_status}"
+    return None
+
+def normalize_order_id(order_id: str) -> Optional[str]:
+    """Canonical uuid text as stored in orders.id, or None when order_id is not a uuid"""
+    try:
+        return str(uuid.UUID(order_id))
+    except ValueError:
+        return None
+
+async def select_status_targets(body: OrderStatusBulkUpdate) -> List[Dict[str, Any]]:
+    if body.order_ids:
+        order_ids = [order_id for order_id in dict.fromkeys(map(normalize_order_id, body.order_ids)) if order_id]
+        orders = []
+        for start in range(0, len(order_ids), BULK_STATUS_CHUNK_SIZE):
+            chunk = order_ids[start:start + BULK_STATUS_CHUNK_SIZE]
+            response = await run_supabase(
+                "orders.get_status",
+                supabase.table("orders").select(STATUS_COLUMNS).in_("id", chunk).execute
+            )
+            orders.extend(response.data)
+        return orders
+
+    orders: List[Dict[str, Any]] = []
+    cursor = None
+    while True:
+        query = supabase.table("orders").select(STATUS_COLUMNS)
+        if body.filter.payment_status:
+            query = query.eq("payment_status", body.filter.payment_status)
+        if body.filter.delivery_status:
+            query = query.eq("delivery_status", body.filter.delivery_status)
+        if body.filter.created_before:
+            query = query.lt("created_at", parse_export_bound(body.filter.created_before, "created_before"))
+        query = apply_keyset(query, BULK_STATUS_CHUNK_SIZE, cursor, descending=False)
+        response = await run_supabase("orders.get_status", query.execute)
+        rows = response.data
+        orders.extend(rows[:BULK_STATUS_CHUNK_SIZE])
+        if len(orders) > BULK_STATUS_MAX_ORDERS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Filter matches more than {BULK_STATUS_MAX_ORDERS} orders; narrow it down"
+            )
+        if len(rows) <= BULK_STATUS_CHUNK_SIZE:
+            return orders
+        cursor = encode_cursor(rows[BULK_STATUS_CHUNK_SIZE - 1])
+
+@api_router.put("/admin/orders/status")
+async def bulk_update_order_status(body: OrderStatusBulkUpdate, user: Dict = Depends(require_admin)):
+    if not body.payment_status and not body.delivery_status:
+        raise HTTPException(status_code=400, detail="payment_status or delivery_status is required")
+    if body.payment_status and body.payment_status not in PAYMENT_TRANSITIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown payment_status: {body.payment_status}")
+    if body.delivery_status and body.delivery_status not in DELIVERY_FLOW:
+        raise HTTPException(status_code=400, detail=f"Unknown delivery_status: {body.delivery_status}")
+    if bool(body.order_ids) == (body.filter is not None):
+        raise HTTPException(status_code=400, detail="Provide either order_ids or filter")
+    if body.filter is not None and not body.filter.model_dump(exclude_none=True):
+        raise HTTPException(status_code=400, detail="filter needs at least one of payment_status, delivery_status or created_before")
+    if body.order_ids and len(body.order_ids) > BULK_STATUS_MAX_ORDERS:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_STATUS_MAX_ORDERS} orders per request")
+
+    try:
+        orders = await select_status_targets(body)
+        update_data = {}
+        if body.payment_status:
+            update_data["payment_status"] = body.payment_status
+        if body.delivery_status:
+            update_data["delivery_status"] = body.delivery_status
+
+        results: Dict[str, Dict[str, Any]] = {}
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for order in orders:
+            error = status_transition_error(order, body.payment_status, body.delivery_status)
+            if error:
+                results[order["id"]] = {"id": order["id"], "status": "invalid_transition", "error": error}
+            elif all(order.get(field) == value for field, value in update_data.items()):
+                results[order["id"]] = {"id": order["id"], "status": "unchanged"}
+            else:
+                groups.setdefault((order.get("payment_status"), order.get("delivery_status")), []).append(order)
+
+        for (payment_status, delivery_status), group in groups.items():
+            previous = {order["id"]: order for order in group}
+            for start in range(0, len(group), BULK_STATUS_CHUNK_SIZE):
+                ids = [order["id"] for order in group[start:start + BULK_STATUS_CHUNK_SIZE]]
+                query = supabase.table("orders").update(update_data).in_("id", ids)
+                query = query.eq("payment_status", payment_status).eq("delivery_status", delivery_status)
+                response = await run_supabase("orders.update", query.execute)
+                for order in response.data:
+                    order_stats.record_status_change(previous[order["id"]], order)
+                    results[order["id"]] = {"id": order["id"], "status": "updated"}
+                for order_id in ids:
+                    results.setdefault(order_id, {"id": order_id, "status": "conflict", "error": "Order changed during update"})
+
+        for order_id in body.order_ids or []:
+            order_id = normalize_order_id(order_id) or order_id
+            results.setdefault(order_id, {"id": order_id, "status": "not_found"})
+
+        outcomes = list(results.values())
+        return {
+            "updated": sum(1 for outcome in outcomes if outcome["status"] == "updated"),
+            "results": outcomes
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Bulk order status error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Order export
+# Orders are read in EXPORT_CHUNK_SIZE keyset pages and written out as they
+# arrive, so memory stays flat however many orders are exported.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+EXPORT_ORDER_COLUMNS = [
+    "id", "created_at", "user_id", "user_email", "customer_name", "customer_phone",
+    "customer_address", "delivery_type", "delivery_charge", "total_amount",
+    "payment_status", "delivery_status"
+]
+EXPORT_ITEM_COLUMNS = ["product_id", "product_name", "quantity", "price"]
+# Spreadsheets evaluate cells starting with these as formulas; customer input
+# reaches the CSV verbatim, so such cells are quoted with a leading apostrophe.
+CSV_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+def csv_cell(value: Any) -> Any:
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+def parse_export_bound(value: Optional[str], name: str) -> Optional[str]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name} date")
+
+def export_records(order: Dict[str, Any], flatten_items: bool) -> List[Dict[str, Any]]:
+    record = {column: order.get(column) for column in EXPORT_ORDER_COLUMNS}
+    items = order.get("items") or []
+    if not flatten_items:
+        return [{**record, "items": items}]
+    if not items:
+        return [{**record, **{f"item_{column}": None for column in EXPORT_ITEM_COLUMNS}}]
+    return [
+        {**record, **{f"item_{column}": item.get(column) for column in EXPORT_ITEM_COLUMNS}}
+        for item in items
+    ]
+
+def iter_order_chunks(date_from: Optional[str], date_to: Optional[str]):
+    def make_query():
+        query = supabase.table("orders").select("*")
+        if date_from:
+            query = query.gte("created_at", date_from)
+        if date_to:
+            query = query.lt("created_at", date_to)
+        return query
+
+    return iter_keyset_pages("orders.export", make_query, EXPORT_CHUNK_SIZE)
+
+async def stream_orders_csv(date_from: Optional[str], date_to: Optional[str], flatten_items: bool):
+    columns = EXPORT_ORDER_COLUMNS + ([f"item_{column}" for column in EXPORT_ITEM_COLUMNS] if flatten_items else ["items"])
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    try:
+        async for orders in iter_order_chunks(date_from, date_to):
+            for order in orders:
+                for record in export_records(order, flatten_items):
+                    if not flatten_items:
+                        record["items"] = orjson.dumps(record["items"]).decode("utf-8")
+                    writer.writerow({column: csv_cell(value) for column, value in record.items()})
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except Exception as e:
+        # The status line is already sent, so abort the body rather than end it cleanly
+        logger.error(f"Order export failed: {str(e)}")
+        raise
+    if buffer.tell():
+        yield buffer.getvalue()
+
+async def stream_orders_ndjson(date_from: Optional[str], date_to: Optional[str], flatten_items: bool):
+    try:
+        async for orders in iter_order_chunks(date_from, date_to):
+            yield b"".join(
+                orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+                for order in orders
+                for record in export_records(order, flatten_items)
+            )
+    except Exception as e:
+        logger.error(f"Order export failed: {str(e)}")
+        raise
+
+@api_router.get("/admin/orders/export")
+async def export_orders(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    date_from: Optional[str] = Query(None, alias="from"),
+    date_to: Optional[str] = Query(None, alias="to"),
+    flatten_items: bool = False,
+    user: Dict = Depends(require_admin)
+):
+    date_from = parse_export_bound(date_from, "from")
+    date_to = parse_export_bound(date_to, "to")
+    filename = f"orders-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "csv":
+        return StreamingResponse(stream_orders_csv(date_from, date_to, flatten_items), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_orders_ndjson(date_from, date_to, flatten_items), media_type="application/x-ndjson", headers=headers)
+
+# Admin stats
+# Dashboard rollups (daily revenue, status histograms, per-product units and
+# revenue) kept in memory and updated by the order write routes. They are
+# rebuilt from a chunked scan on first use, every STATS_REBUILD_INTERVAL seconds
+# to pick up writes made by other workers, and on demand via /admin/stats/rebuild.
+STATS_REBUILD_INTERVAL = float(os.getenv("STATS_REBUILD_INTERVAL", "3600"))
+
+def bump(histogram: Dict[str, Any], key: Optional[str], amount: float = 1):
+    if key is None:
+        return
+    histogram[key] = histogram.get(key, 0) + amount
+    if not histogram[key]:
+        del histogram[key]
+
+class OrderStats(RefreshingState):
+    label = "Order stats"
+
+    def __init__(self, rebuild_interval: float):
+        super().__init__(rebuild_interval)
+        self.reset()
+
+    def reset(self):
+        self.order_count = 0
+        self.revenue = 0.0
+        self.daily: Dict[str, Dict[str, float]] = {}
+        self.payment_status: Dict[str, int] = {}
+        self.delivery_status: Dict[str, int] = {}
+        self.products: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, order: Dict[str, Any], sign: int = 1):
+        """Add (sign=1) or remove (sign=-1) an order's contribution to every rollup"""
+        total = float(order.get("total_amount") or 0)
+        self.order_count += sign
+        self.revenue += sign * total
+        day = self.daily.setdefault((order.get("created_at") or "")[:10], {"orders": 0, "revenue": 0.0})
+        day["orders"] += sign
+        day["revenue"] += sign * total
+        bump(self.payment_status, order.get("payment_status"), sign)
+        bump(self.delivery_status, order.get("delivery_status"), sign)
+        for item in order.get("items") or []:
+            product = self.products.setdefault(
+                item.get("product_id"),
+                {"product_id": item.get("product_id"), "product_name": item.get("product_name"), "units": 0, "revenue": 0.0}
+            )
+            quantity = int(item.get("quantity") or 0)
+            product["units"] += sign * quantity
+            product["revenue"] += sign * quantity * float(item.get("price") or 0)
+
+    def record_status_change(self, before: Dict[str, Any], after: Dict[str, Any]):
+        for field, histogram in (("payment_status", self.payment_status), ("delivery_status", self.delivery_status)):
+            if before.get(field) != after.get(field):
+                bump(histogram, before.get(field), -1)
+                bump(histogram, after.get(field), 1)
+
+    async def load(self):
+        fresh = OrderStats(self.ttl)
+        async for orders in iter_order_chunks(None, None):
+            for order in orders:
+                fresh.record(order)
+        self.order_count, self.revenue, self.daily = fresh.order_count, fresh.revenue, fresh.daily
+        self.payment_status, self.delivery_status = fresh.payment_status, fresh.delivery_status
+        self.products = fresh.products
+        self.loaded_at = time.monotonic()
+
+    async def rebuild(self):
+        async with self.lock:
+            await self.load()
+
+    def snapshot(self, days: int, top: int) -> Dict[str, Any]:
+        recent_days = sorted(day for day in self.daily if day)[-days:]
+        top_products = heapq.nlargest(top, self.products.values(), key=lambda product: product["revenue"])
+        return {
+            "orders": self.order_count,
+            "revenue": round(self.revenue, 2),
+            "payment_status": self.payment_status,
+            "delivery_status": self.delivery_status,
+            "daily": [
+                {"date": day, "orders": self.daily[day]["orders"], "revenue": round(self.daily[day]["revenue"], 2)}
+                for day in recent_days
+            ],
+            "top_products": [{**product, "revenue": round(product["revenue"], 2)} for product in top_products],
+        }
+
+order_stats = OrderStats(STATS_REBUILD_INTERVAL)
+
+@api_router.get("/admin/stats")
+async def get_admin_stats(
+    days: int = Query(30, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100),
+    user: Dict = Depends(require_admin)
+):
+    try:
+        await order_stats.ensure_fresh()
+        return order_stats.snapshot(days, top)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/admin/stats/rebuild")
+async def rebuild_admin_stats(user: Dict = Depends(require_admin)):
+    try:
+        await order_stats.rebuild()
+        return {"message": "Stats rebuilt", "orders": order_stats.order_count}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Testimonials
 @api_router.get("/testimonials")
-async def list_testimonials():
-    try:
-        response = supabase.table("testimonials").select("*").execute()
+async def list_testimonials(request: Request):
+    async def load():
+        response = await run_supabase("testimonials.select", supabase.table("testimonials").select("*").execute)
         return response.data
+
+    try:
+        entry = await catalog_cache.get_or_load(("testimonials",), load)
+        return conditional_response(request, entry, TESTIMONIALS_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -385,27 +2973,92 @@ async def create_testimonial(testimonial: TestimonialBase, user: Dict = Depends(
             **testimonial.model_dump(),
             "created_at": datetime.utcnow().isoformat()
         }
-        response = supabase.table("testimonials").insert(data).execute()
+        response = await run_supabase("testimonials.insert", supabase.table("testimonials").insert(data).execute)
+        catalog_cache.invalidate(("testimonials",))
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.delete("/testimonials/{testimonial_id}")
 async def delete_testimonial(testimonial_id: str, user: Dict = Depends(require_admin)):
     try:
-        supabase.table("testimonials").delete().eq("id", testimonial_id).execute()
+        await run_supabase("testimonials.delete", supabase.table("testimonials").delete().eq("id", testimonial_id).execute)
+        catalog_cache.invalidate(("testimonials",))
         return {"message": "Testimonial deleted"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # Content
+# The content table is small and only written through update_content, so every
+# page is loaded into memory at startup and served with no I/O. update_content
+# swaps in the new row and bumps the version; a reload every CONTENT_STORE_TTL
+# seconds picks up writes made through other workers. Pages are also rendered
+# once to escaped HTML, and both forms are cached pre-encoded.
+CONTENT_STORE_TTL = float(os.getenv("CONTENT_STORE_TTL", "300"))
+
+class ContentHtmlEntry(CatalogEntry):
+    __slots__ = ()
+    media_type = "text/html; charset=utf-8"
+
+    @property
+    def body(self) -> bytes:
+        if self._body is None:
+            paragraphs = [part.strip() for part in re.split(r"\n\s*\n", self.data.get("content") or "") if part.strip()]
+            self._body = "".join(
+                f"<p>{html.escape(paragraph).replace(chr(10), '<br>')}</p>" for paragraph in paragraphs
+            ).encode("utf-8")
+        return self._body
+
+class ContentStore(RefreshingState):
+    label = "Content store"
+
+    def __init__(self, ttl: float):
+        super().__init__(ttl)
+        self.pages: Dict[str, tuple] = {}
+        self.version = 0
+
+    @staticmethod
+    def entries(row: Dict[str, Any]) -> tuple:
+        return CatalogEntry(row), ContentHtmlEntry(row)
+
+    async def load(self):
+        response = await run_supabase("content.select", supabase.table("content").select("*").execute)
+        self.pages = {row["page"]: self.entries(row) for row in response.data}
+        self.version += 1
+        self.loaded_at = time.monotonic()
+
+    async def get(self, page: str, as_html: bool = False) -> CatalogEntry:
+        await self.ensure_fresh()
+        entries = self.pages.get(page) or self.entries({"page": page, "content": ""})
+        return entries[1] if as_html else entries[0]
+
+    def put(self, row: Dict[str, Any]):
+        self.pages = {**self.pages, row["page"]: self.entries(row)}
+        self.version += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"pages": len(self.pages), "version": self.version}
+
+content_store = ContentStore(CONTENT_STORE_TTL)
+
+@app.on_event("startup")
+async def preload_content():
+    try:
+        await content_store.ensure_fresh()
+    except Exception as e:
+        logger.error(f"Content preload failed, loading on first request: {str(e)}")
+
 @api_router.get("/content/{page}")
-async def get_content(page: str):
+async def get_content(page: str, request: Request, format: str = Query("json", pattern="^(json|html)$")):
     try:
-        response = supabase.table("content").select("*").eq("page", page).execute()
-        if not response.data:
-            return {"page": page, "content": ""}
-        return response.data[0]
+        entry = await content_store.get(page, as_html=format == "html")
+        return conditional_response(request, entry, CONTENT_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -417,8 +3070,12 @@ async def update_content(page: str, content: ContentBase, user: Dict = Depends(r
             "content": content.content,
             "updated_at": datetime.utcnow().isoformat()
         }
-        response = supabase.table("content").upsert(data).execute()
+        response = await run_supabase("content.upsert", supabase.table("content").upsert(data, on_conflict="page").execute)
+        if response.data:
+            content_store.put(response.data[0])
         return response.data[0] if response.data else {}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -426,16 +3083,47 @@ async def update_content(page: str, content: ContentBase, user: Dict = Depends(r
 async def root():
     return {"message": "Zouqly API with Supabase"}
 
+REGISTRY.register(ServerStatsCollector())
+
+@api_router.get("/metrics")
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return Response(content=generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
+
 @api_router.get("/health")
 async def health_check():
-    return {"status": "healthy"}
+    return {
+        "status": "healthy",
+        "supabase_pool": supabase_pool_snapshot(),
+        "catalog_cache": catalog_cache.snapshot(),
+        "admission": admission_snapshot(),
+        "content_store": content_store.snapshot()
+    }
 
 app.include_router(api_router)
 
+app.add_middleware(CompressionMiddleware)
+
+app.add_middleware(UploadSizeLimitMiddleware, limits={"/api/upload": UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD})
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+
+app.add_middleware(MetricsMiddleware)
+
+@app.on_event("startup")
+async def start_event_loop_probe():
+    app.state.event_loop_probe = asyncio.create_task(probe_event_loop())
+
+@app.on_event("shutdown")
+async def shutdown_supabase_pool():
+    app.state.event_loop_probe.cancel()
+    supabase_executor.shutdown(wait=False)
+    image_executor.shutdown(wait=False)
@@ -0,0 +1,139 @@
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import jwt
+import pytest
+import supabase
+
+from tests.supabase_stub import StubClient
+
+JWT_SECRET = "test-jwt-secret"
+WORDS = (
+    "almond cashew pistachio walnut raisin date fig apricot roasted salted premium organic crunchy sweet "
+    "healthy protein fiber natural golden jumbo iranian californian kashmiri mamra honey coated spicy masala"
+).split()
+TAGS = ["bestseller", "trending", "new", "gift", "organic"]
+CATEGORIES = [str(uuid.UUID(int=n)) for n in range(8)]
+
+os.environ.update({
+    "SUPABASE_URL": "https://stub.supabase.co",
+    "SUPABASE_SERVICE_ROLE_KEY": "service-role-key",
+    "SUPABASE_JWT_SECRET": JWT_SECRET,
+    "SUPABASE_RETRY_BASE_DELAY": "0.001",
+    "ORDER_IP_RATE_LIMIT": "100000/1",
+    "ORDER_USER_RATE_LIMIT": "100000/1",
+    "ORDER_MAX_CONCURRENCY": "1000",
+})
+
+stub_client = StubClient()
+supabase.create_client = lambda url, key, options=None: stub_client
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "benchmark: performance benchmarks; sizes scale with BENCHMARK_SCALE")
+
+
+def benchmark_scale() -> int:
+    return int(os.getenv("BENCHMARK_SCALE", "1"))
+
+
+def make_token(user_id: str, role: str = "user", email: str = None) -> str:
+    claims = {
+        "sub": user_id,
+        "email": email or f"{user_id}@example.com",
+        "aud": "authenticated",
+        "exp": int(time.time()) + 600,
+        "user_metadata": {"role": role},
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+def auth_headers(user_id: str, role: str = "user") -> dict:
+    return {"Authorization": f"Bearer {make_token(user_id, role)}"}
+
+
+def make_products(count: int, seed: int = 1, **overrides) -> list:
+    """Complete product rows with seeded names, facets and prices; every description ends in a unique sku{n}"""
+    rnd = random.Random(seed)
+    products = []
+    for n in range(count):
+        created_at = (datetime(2026, 1, 1) + timedelta(seconds=n)).isoformat()
+        products.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "name": " ".join(rnd.sample(WORDS, 3)),
+            "weight": "250g",
+            "price": round(rnd.uniform(50, 2000), 2),
+            "description": " ".join(rnd.choices(WORDS, k=rnd.randint(5, 25))) + f" sku{n}",
+            "features": rnd.sample(WORDS, 3),
+            "category_id": rnd.choice(CATEGORIES),
+            "tags": rnd.sample(TAGS, rnd.randint(0, 3)),
+            "image_url": None,
+            "stock": rnd.choice([0, 0, 3, 10, 50]),
+            "is_featured": rnd.random() < 0.1,
+            "created_at": created_at,
+            "updated_at": created_at,
+            **overrides,
+        })
+    return products
+
+
+def make_product(**overrides) -> dict:
+    """One product row with a fresh random id"""
+    return make_products(1, seed=None, **overrides)[0]
+
+
+def add_product(stub, **overrides) -> str:
+    product = make_product(**overrides)
+    stub.tables.setdefault("products", []).append(product)
+    return product["id"]
+
+
+def reset_server_state():
+    """Replace the module-level caches and indexes so every test starts cold"""
+    server.catalog_cache = server.CatalogCache(server.CATALOG_CACHE_TTL, server.CATALOG_NEGATIVE_TTL, server.CATALOG_CACHE_SIZE)
+    server.price_index = server.PriceIndex(server.PRICE_INDEX_TTL)
+    server.search_index = server.SearchIndex(server.SEARCH_INDEX_TTL)
+    server.facet_index = server.FacetIndex(server.FACET_INDEX_TTL)
+    server.order_stats = server.OrderStats(server.STATS_REBUILD_INTERVAL)
+    server.upload_index = server.UploadIndex(server.UPLOAD_INDEX_SIZE)
+    server.content_store = server.ContentStore(server.CONTENT_STORE_TTL)
+    server.user_directory = server.UserDirectory(server.USER_DIRECTORY_TTL, server.USER_DIRECTORY_PAGE_SIZE)
+    server.verified_tokens.clear()
+    for upstream in server.circuit_breakers:
+        server.circuit_breakers[upstream] = server.CircuitBreaker(
+            upstream, server.BREAKER_FAILURE_THRESHOLD, server.BREAKER_COOLDOWN
+        )
+    for control in server.admission_controls.values():
+        control.in_flight = 0
+        control.rejected.clear()
+        for bucket in (control.per_ip, control.per_user):
+            if bucket:
+                bucket.buckets.clear()
+
+
+@pytest.fixture
+def stub():
+    stub_client.reset()
+    reset_server_state()
+    return stub_client
+
+
+@pytest.fixture
+def client(stub):
+    from fastapi.testclient import TestClient
+
+    # No lifespan: the shutdown hook would stop the shared offload pools
+    return TestClient(server.app)
+
+
+@pytest.fixture
+def admin_headers():
+    return auth_headers("admin-1", "admin")
@@ -0,0 +1,296 @@
+"""In-memory stand-in for the synchronous supabase client used by backend/server.py.
+
+It implements the slice of the postgrest query builder, rpc, storage and auth
+APIs the server calls, records every round-trip in ``calls`` and can add a
+fixed latency to each call, cap result sizes like PostgREST's max-rows setting
+or fail calls on demand. Set ``keep_blobs`` to False to drop uploaded bytes when
+measuring memory.
+"""
+import copy
+import re
+import threading
+import time
+import types
+import uuid
+from datetime import datetime
+
+from postgrest.exceptions import APIError
+
+COMPARATORS = {
+    "eq": lambda a, b: a == b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+
+class Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+def split_top_level(expression):
+    parts, depth, current = [], 0, ""
+    for char in expression:
+        depth += char == "("
+        depth -= char == ")"
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+def parse_or_term(term):
+    nested = re.fullmatch(r"and\((.*)\)", term)
+    if nested:
+        predicates = [parse_or_term(part) for part in split_top_level(nested.group(1))]
+        return lambda row: all(predicate(row) for predicate in predicates)
+    column, op, value = term.split(".", 2)
+    value = value.strip('"')
+    return lambda row: row.get(column) is not None and COMPARATORS[op](str(row[column]), value)
+
+
+class Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = "select"
+        self.columns = "*"
+        self.payload = None
+        self.filters = []
+        self.orders = []
+        self.row_limit = None
+
+    def select(self, columns="*", count=None):
+        self.op, self.columns = "select", columns
+        return self
+
+    def insert(self, data, returning=None):
+        self.op, self.payload = "insert", data
+        return self
+
+    def upsert(self, data, on_conflict=None, returning=None, **kwargs):
+        self.op, self.payload = "upsert", data
+        self.conflict_key = on_conflict or "id"
+        return self
+
+    def update(self, data):
+        self.op, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.op = "delete"
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append(lambda row: row.get(column) is not None and COMPARATORS[op](str(row[column]), str(value)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, "eq", value)
+
+    def lt(self, column, value):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column, value):
+        return self._filter(column, "lte", value)
+
+    def gt(self, column, value):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column, value):
+        return self._filter(column, "gte", value)
+
+    def in_(self, column, values):
+        values = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in values)
+        return self
+
+    def or_(self, expression):
+        predicates = [parse_or_term(term) for term in split_top_level(expression)]
+        self.filters.append(lambda row: any(predicate(row) for predicate in predicates))
+        return self
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        self.client.round_trip(self.table, self.op)
+        with self.client.lock:
+            rows = self.client.tables.setdefault(self.table, [])
+            if self.op in ("insert", "upsert"):
+                return Result(self._write(rows))
+            matched = [row for row in rows if all(predicate(row) for predicate in self.filters)]
+            if self.op == "update":
+                for row in matched:
+                    row.update(copy.deepcopy(self.payload))
+                return Result(copy.deepcopy(matched))
+            if self.op == "delete":
+                for row in matched:
+                    rows.remove(row)
+                return Result(copy.deepcopy(matched))
+
+            for column, desc in reversed(self.orders):
+                matched.sort(key=lambda row: str(row.get(column)), reverse=desc)
+            limit = self.client.max_rows
+            if self.row_limit is not None:
+                limit = self.row_limit if limit is None else min(limit, self.row_limit)
+            if limit is not None:
+                matched = matched[:limit]
+            matched = copy.deepcopy(matched)
+            if self.columns != "*":
+                columns = [column.strip() for column in self.columns.split(",")]
+                matched = [{column: row.get(column) for column in columns} for row in matched]
+            return Result(matched, count=len(matched))
+
+    def _write(self, rows):
+        items = self.payload if isinstance(self.payload, list) else [self.payload]
+        if len({frozenset(item) for item in items}) > 1:
+            # PostgREST bulk writes use the first object's keys for every row
+            raise APIError({"message": "All object keys must match", "code": "PGRST102"})
+        written = []
+        for item in copy.deepcopy(items):
+            existing = None
+            if self.op == "upsert":
+                key = self.conflict_key
+                existing = next((row for row in rows if key in item and row.get(key) == item[key]), None)
+            if existing is not None:
+                existing.update(item)
+                written.append(copy.deepcopy(existing))
+                continue
+            item.setdefault("id", str(uuid.uuid4()))
+            item.setdefault("created_at", datetime.utcnow().isoformat())
+            rows.append(item)
+            written.append(copy.deepcopy(item))
+        return written
+
+
+class RPC:
+    def __init__(self, client, name, params):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self):
+        self.client.round_trip("rpc", self.name)
+        return Result(self.client.rpcs[self.name](self.client, self.params))
+
+
+class Bucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def upload(self, path, content, file_options=None):
+        self.client.round_trip("storage", "upload")
+        if hasattr(content, "read"):
+            # Drain file objects in chunks, as the HTTP client streams them
+            chunks = iter(lambda: content.read(64 * 1024), b"")
+            if self.client.keep_blobs:
+                content = b"".join(chunks)
+            else:
+                for _ in chunks:
+                    pass
+                content = b""
+        self.client.blobs[path] = content
+        return {"path": path}
+
+    def get_public_url(self, path):
+        return f"https://stub.supabase.co/storage/v1/object/public/{self.name}/{path}"
+
+    def download(self, path):
+        self.client.round_trip("storage", "download")
+        return self.client.blobs[path]
+
+    def list(self, path="", options=None):
+        self.client.round_trip("storage", "list")
+        search = (options or {}).get("search", "")
+        return [
+            {"name": key.rsplit("/", 1)[-1]}
+            for key in self.client.blobs
+            if key.startswith(f"{path}/") and search in key.rsplit("/", 1)[-1]
+        ]
+
+
+class Storage:
+    def __init__(self, client):
+        self.client = client
+
+    def from_(self, name):
+        return Bucket(self.client, name)
+
+
+class AuthAdmin:
+    def __init__(self, client):
+        self.client = client
+
+    def list_users(self, page=1, per_page=50):
+        self.client.round_trip("auth", "list_users")
+        # GoTrue lists the newest users first
+        users = list(self.client.users.values())[::-1]
+        return users[(page - 1) * per_page:page * per_page]
+
+    def update_user_by_id(self, user_id, attributes):
+        self.client.round_trip("auth", "update_user")
+        for user in self.client.users.values():
+            if user.id == user_id:
+                user.user_metadata.update(attributes.get("user_metadata", {}))
+                return types.SimpleNamespace(user=user)
+        return None
+
+
+class Auth:
+    def __init__(self, client):
+        self.client = client
+        self.admin = AuthAdmin(client)
+
+    def get_user(self, token):
+        self.client.round_trip("auth", "get_user")
+        user = self.client.sessions.get(token)
+        return types.SimpleNamespace(user=user) if user else None
+
+
+class StubClient:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.auth = Auth(self)
+        self.storage = Storage(self)
+        self.reset()
+
+    def reset(self):
+        self.tables = {}
+        self.rpcs = {}
+        self.blobs = {}
+        self.keep_blobs = True
+        self.users = {}
+        self.sessions = {}
+        self.calls = []
+        self.latency = 0.0
+        self.max_rows = None
+        self.failure = None
+
+    def round_trip(self, target, op):
+        self.calls.append((target, op))
+        if self.latency:
+            time.sleep(self.latency)
+        if self.failure is not None:
+            raise self.failure
+
+    def table(self, name):
+        return Query(self, name)
+
+    def rpc(self, name, params=None):
+        return RPC(self, name, params or {})
+
+    def calls_to(self, target, op=None):
+        return sum(1 for call in self.calls if call[0] == target and (op is None or call[1] == op))
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+import pytest
+
+import server
+from tests.conftest import add_product, auth_headers
+from tests.test_orders import order_body, place_order_rpc
+
+
+@pytest.fixture
+def orders_control():
+    """conftest lifts the order limits through the environment, so tests set their own"""
+    return server.admission_controls["orders"]
+
+
+@pytest.fixture
+def sku(stub):
+    stub.rpcs["place_order"] = place_order_rpc
+    return add_product(stub, stock=100)
+
+
+def place(client, sku: str, user_id: str = "buyer"):
+    return client.post("/api/orders", json=order_body((sku, 1)), headers=auth_headers(user_id))
+
+
+def test_ip_over_its_rate_gets_429_with_retry_after(client, stub, orders_control, sku, monkeypatch):
+    monkeypatch.setattr(orders_control, "per_ip", server.TokenBucket("2/60"))
+
+    statuses = [place(client, sku, f"buyer-{n}").status_code for n in range(2)]
+    rejected = place(client, sku, "buyer-2")
+
+    assert statuses == [200, 200]
+    assert rejected.status_code == 429
+    # One token refills every 30 seconds
+    assert rejected.headers["retry-after"] == "30"
+    assert stub.calls_to("rpc", "place_order") == 2
+    assert orders_control.snapshot()["rejected"] == {"ip_rate": 1}
+
+
+def test_user_bucket_limits_each_user_separately(client, stub, orders_control, sku, monkeypatch):
+    monkeypatch.setattr(orders_control, "per_user", server.TokenBucket("1/10"))
+
+    assert place(client, sku, "alice").status_code == 200
+    rejected = place(client, sku, "alice")
+    assert place(client, sku, "bob").status_code == 200
+
+    assert rejected.status_code == 429 and rejected.headers["retry-after"] == "10"
+    assert orders_control.snapshot()["rejected"] == {"user_rate": 1}
+    assert orders_control.snapshot()["tracked_keys"] == 3
+
+
+def test_concurrency_slot_is_held_for_the_request_and_released_on_error(client, stub, orders_control, sku, monkeypatch):
+    monkeypatch.setattr(orders_control, "max_concurrency", 1)
+    stub.latency = 0.1
+
+    async def two_at_once():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            body = order_body((sku, 1))
+            return await asyncio.gather(*[
+                http.post("/api/orders", json=body, headers=auth_headers(f"buyer-{n}")) for n in range(2)
+            ])
+
+    responses = asyncio.run(two_at_once())
+    assert sorted(response.status_code for response in responses) == [200, 429]
+    assert orders_control.snapshot()["rejected"] == {"concurrency": 1}
+    stub.latency = 0.0
+
+    def failing_rpc(client, params):
+        raise RuntimeError("connection reset by peer")
+
+    stub.rpcs["place_order"] = failing_rpc
+    assert place(client, sku).status_code == 500
+    assert orders_control.in_flight == 0
+
+    stub.rpcs["place_order"] = place_order_rpc
+    assert place(client, sku, "buyer-2").status_code == 200
+    assert orders_control.in_flight == 0
+
+
+def test_idle_buckets_are_swept():
+    bucket = server.TokenBucket("2/10")
+    for n in range(100):
+        assert bucket.acquire(f"10.0.0.{n}") == 0.0
+    assert bucket.acquire("10.0.0.0") == 0.0
+    assert bucket.acquire("10.0.0.0") > 0
+
+    # Age every bucket past its 10 second refill time except the drained one
+    bucket.buckets = {
+        key: (tokens, stamp - (0 if key == "10.0.0.0" else 10)) for key, (tokens, stamp) in bucket.buckets.items()
+    }
+    bucket.swept_at -= server.RATE_LIMIT_SWEEP_INTERVAL
+    bucket.acquire("10.0.1.1")
+
+    # A refilled bucket is the same as a missing one, but a drained one must stay
+    assert sorted(bucket.buckets) == ["10.0.0.0", "10.0.1.1"]
+    assert bucket.acquire("10.0.0.0") > 0
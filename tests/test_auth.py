@@ -0,0 +1,67 @@
+import hashlib
+import time
+import types
+
+import jwt
+import pytest
+
+import server
+from tests.conftest import JWT_SECRET, make_token
+
+
+def claims(**overrides) -> dict:
+    return {
+        "sub": "buyer", "email": "buyer@example.com", "aud": "authenticated",
+        "exp": int(time.time()) + 600, "user_metadata": {"role": "user"}, **overrides,
+    }
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_valid_token_is_accepted(client):
+    assert client.get("/api/orders", headers=bearer(make_token("buyer"))).status_code == 200
+
+
+@pytest.mark.parametrize("token", [
+    pytest.param(jwt.encode(claims(exp=int(time.time()) - 10), JWT_SECRET, algorithm="HS256"), id="expired"),
+    pytest.param(jwt.encode(claims(), "forged-secret", algorithm="HS256"), id="forged-signature"),
+    pytest.param(jwt.encode({key: value for key, value in claims().items() if key != "aud"}, JWT_SECRET, algorithm="HS256"), id="missing-aud"),
+    pytest.param(jwt.encode(claims(aud="anon"), JWT_SECRET, algorithm="HS256"), id="wrong-aud"),
+    pytest.param(jwt.encode(claims(), None, algorithm="none"), id="alg-none"),
+    pytest.param("not-a-jwt", id="garbage"),
+])
+def test_invalid_tokens_are_rejected(client, stub, token):
+    response = client.get("/api/orders", headers=bearer(token))
+
+    assert response.status_code == 401
+    assert stub.calls_to("orders") == 0
+
+
+def test_verified_token_cache_honours_exp(client, stub, monkeypatch):
+    token = make_token("buyer")
+    assert client.get("/api/orders", headers=bearer(token)).status_code == 200
+
+    # With the secret rotated, only the cache can still vouch for the token
+    monkeypatch.setattr(server, "SUPABASE_JWT_SECRET", "rotated-secret")
+    assert client.get("/api/orders", headers=bearer(token)).status_code == 200
+
+    cache_key = hashlib.sha256(token.encode()).digest()
+    user, _ = server.verified_tokens[cache_key]
+    server.verified_tokens[cache_key] = (user, time.time() - 1)
+    assert client.get("/api/orders", headers=bearer(token)).status_code == 401
+
+
+def test_remote_fallback_verifies_tokens_without_a_local_key(client, stub, monkeypatch):
+    monkeypatch.setattr(server, "SUPABASE_JWT_SECRET", None)
+    token = make_token("buyer")
+    stub.sessions[token] = types.SimpleNamespace(id="buyer", email="buyer@example.com", user_metadata={"role": "user"})
+
+    assert client.get("/api/orders", headers=bearer(token)).status_code == 401
+    assert stub.calls_to("auth", "get_user") == 0
+
+    monkeypatch.setattr(server, "AUTH_REMOTE_FALLBACK", True)
+    assert client.get("/api/orders", headers=bearer(token)).status_code == 200
+    assert client.get("/api/orders", headers=bearer(make_token("stranger"))).status_code == 401
+    assert stub.calls_to("auth", "get_user") == 2
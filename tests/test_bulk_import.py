@@ -0,0 +1,56 @@
+import uuid
+
+import orjson
+
+from tests.conftest import make_product
+
+CATEGORY_ID = str(uuid.UUID(int=1))
+STORED = {"category_id": CATEGORY_ID, "tags": ["bestseller"], "image_url": "/api/uploads/a.webp", "stock": 40}
+
+
+def import_file(client, headers, name: str, content: bytes):
+    return client.post("/api/admin/products/bulk", headers=headers, files={"file": (name, content)})
+
+
+def test_partial_reimport_keeps_columns_the_file_leaves_out(client, stub, admin_headers):
+    stub.tables["categories"] = [{"id": CATEGORY_ID, "name": "Nuts"}]
+    first, second = make_product(**STORED), make_product(**{**STORED, "name": "Almonds", "stock": 7})
+    stub.tables["products"] = [dict(first), dict(second)]
+
+    content = b"\n".join(orjson.dumps(record) for record in [
+        {"id": first["id"], "name": "Cashews W320", "weight": "250g", "price": 120, "description": "Whole cashews",
+         "features": ["whole"], "category_id": CATEGORY_ID},
+        {"id": second["id"], "name": "Almonds", "weight": "250g", "price": 90, "description": "Almonds",
+         "features": [], "category_id": CATEGORY_ID, "stock": 0},
+        {"name": "Raisins", "weight": "500g", "price": 60, "description": "Golden raisins", "features": [],
+         "category": "nuts"},
+    ])
+    report = import_file(client, admin_headers, "products.jsonl", content).json()
+
+    assert report["imported"] == 3 and report["failed"] == 0
+    stored = {row["name"]: row for row in stub.tables["products"]}
+    assert stored["Cashews W320"]["price"] == 120
+    assert {column: stored["Cashews W320"][column] for column in ("stock", "tags", "image_url")} == {
+        "stock": 40, "tags": ["bestseller"], "image_url": "/api/uploads/a.webp",
+    }
+    assert stored["Almonds"]["stock"] == 0 and stored["Almonds"]["tags"] == ["bestseller"]
+    assert stored["Raisins"]["stock"] == 0 and stored["Raisins"]["tags"] == []
+    # The two id rows set different columns, so they go out as separate upserts
+    assert stub.calls_to("products", "upsert") == 2
+
+
+def test_csv_reimport_without_list_columns_keeps_tags(client, stub, admin_headers):
+    stub.tables["categories"] = [{"id": CATEGORY_ID, "name": "Nuts"}]
+    product = make_product(**STORED)
+    stub.tables["products"] = [dict(product)]
+
+    content = (
+        "id,name,weight,price,description,features,category\n"
+        f"{product['id']},Cashews,250g,95,Roasted cashews,crunchy|salted,Nuts\n"
+    ).encode()
+    report = import_file(client, admin_headers, "products.csv", content).json()
+
+    assert report["imported"] == 1
+    [stored] = stub.tables["products"]
+    assert stored["price"] == 95 and stored["features"] == ["crunchy", "salted"]
+    assert stored["tags"] == ["bestseller"] and stored["stock"] == 40
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+
+import server
+
+
+def trip(breaker: server.CircuitBreaker):
+    """Open the breaker with its cooldown already over, so the next call is the half-open probe"""
+    breaker.state = "open"
+    breaker.opened_at = time.monotonic() - breaker.cooldown - 1
+
+
+def select_orders():
+    return server.run_supabase("orders.select", server.supabase.table("orders").select("*").execute)
+
+
+def test_cancelled_probe_lets_the_next_call_probe(stub):
+    breaker = server.circuit_breakers["db"]
+    trip(breaker)
+    stub.latency = 0.2
+
+    async def cancel_probe():
+        probe = asyncio.create_task(select_orders())
+        await asyncio.sleep(0.05)
+        assert breaker.probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+
+    assert breaker.state == "half_open" and not breaker.probing
+    stub.latency = 0.0
+    assert asyncio.run(select_orders()).data == []
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_and_concurrent_calls_are_rejected(stub):
+    breaker = server.circuit_breakers["db"]
+    trip(breaker)
+    stub.latency = 0.05
+    stub.failure = TimeoutError()
+
+    async def probe_with_a_second_call():
+        probe = asyncio.create_task(select_orders())
+        await asyncio.sleep(0.01)
+        with pytest.raises(server.UpstreamError) as rejected:
+            await select_orders()
+        with pytest.raises(server.UpstreamError) as failed:
+            await probe
+        return rejected.value, failed.value
+
+    rejected, failed = asyncio.run(probe_with_a_second_call())
+
+    assert rejected.status_code == 503 and failed.status_code == 504
+    assert breaker.state == "open" and not breaker.probing
@@ -0,0 +1,148 @@
+import asyncio
+import gzip
+import uuid
+import zlib
+
+import brotli
+import httpx
+import orjson
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, Response
+from fastapi.testclient import TestClient
+
+import server
+from tests.conftest import make_products
+
+
+def compressed_app() -> TestClient:
+    """A bare app behind CompressionMiddleware serving text of any size"""
+    app = FastAPI()
+
+    @app.get("/text")
+    async def text(size: int, vary: str = None):
+        return PlainTextResponse("x" * size, headers={"Vary": vary} if vary else None)
+
+    @app.get("/image")
+    async def image():
+        return Response(b"\x89PNG" + bytes(4096), media_type="image/png")
+
+    return TestClient(server.CompressionMiddleware(app))
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    ("gzip, br", "br"),
+    ("gzip, deflate", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0.8, gzip;q=0.8", "br"),
+    ("*", "br"),
+    ("br;q=0, *;q=0.3", "gzip"),
+    ("gzip;q=0, br;q=0", None),
+    ("br;q=bogus, gzip;q=0", None),
+    ("identity", None),
+])
+def test_q_values_pick_the_encoding(accept_encoding, expected):
+    assert server.negotiate_encoding(accept_encoding) == expected
+
+    response = compressed_app().get("/text", params={"size": 4096}, headers={"Accept-Encoding": accept_encoding})
+
+    assert response.headers.get("content-encoding") == expected
+    assert response.text == "x" * 4096
+
+
+def test_bodies_under_the_minimum_size_pass_through():
+    client = compressed_app()
+    headers = {"Accept-Encoding": "gzip, br"}
+
+    small = client.get("/text", params={"size": server.COMPRESSION_MIN_SIZE - 1}, headers=headers)
+    large = client.get("/text", params={"size": server.COMPRESSION_MIN_SIZE}, headers=headers)
+
+    assert "content-encoding" not in small.headers
+    assert small.headers["content-length"] == str(server.COMPRESSION_MIN_SIZE - 1)
+    assert large.headers["content-encoding"] == "br"
+    assert int(large.headers["content-length"]) < server.COMPRESSION_MIN_SIZE
+    # Both sizes depend on Accept-Encoding, so caches must key on it either way
+    assert small.headers["vary"] == large.headers["vary"] == "Accept-Encoding"
+
+
+def test_vary_is_extended_once_and_skipped_for_incompressible_types():
+    client = compressed_app()
+    headers = {"Accept-Encoding": "gzip"}
+
+    origin = client.get("/text", params={"size": 4096, "vary": "Origin"}, headers=headers)
+    already = client.get("/text", params={"size": 4096, "vary": "accept-encoding"}, headers=headers)
+    image = client.get("/image", headers=headers)
+
+    assert origin.headers.get_list("vary") == ["Origin, Accept-Encoding"]
+    assert already.headers.get_list("vary") == ["accept-encoding"]
+    assert "content-encoding" not in image.headers and "vary" not in image.headers
+    assert image.content.startswith(b"\x89PNG")
+
+
+def test_export_is_compressed_chunk_by_chunk(stub, admin_headers, monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_CHUNK_SIZE", 2)
+    stub.tables["orders"] = [
+        {
+            "id": str(uuid.UUID(int=n + 1)), "user_id": f"buyer-{n}", "customer_name": "Asha " * 100,
+            "items": [], "total_amount": 100.0, "created_at": f"2026-01-01T00:00:{n:02d}",
+        }
+        for n in range(5)
+    ]
+
+    async def export(accept_encoding: str) -> tuple:
+        """The response headers and each body message exactly as the app sent them"""
+        headers = {**admin_headers, "Accept-Encoding": accept_encoding}
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": "/api/admin/orders/export", "raw_path": b"/api/admin/orders/export", "query_string": b"format=csv",
+            "root_path": "", "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+            "client": ("127.0.0.1", 1234), "server": ("test", 80),
+        }
+        messages = []
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        await server.app(scope, receive, send)
+        start, *bodies = messages
+        return httpx.Headers(start["headers"]), [message["body"] for message in bodies if message["body"]]
+
+    plain_headers, plain_chunks = asyncio.run(export("identity"))
+    headers, chunks = asyncio.run(export("gzip"))
+
+    assert "content-encoding" not in plain_headers
+    assert headers["content-encoding"] == "gzip" and "content-length" not in headers
+    assert len(chunks) >= 3
+    # Every chunk is flushed, so each one decodes on arrival rather than at the end
+    decoder = zlib.decompressobj(31)
+    decoded = [decoder.decompress(chunk) for chunk in chunks]
+    assert all(decoded[:-1]) and decoder.eof
+    assert b"".join(decoded) == b"".join(plain_chunks)
+
+
+def test_pre_encoded_catalog_bodies_pass_through(client, stub):
+    stub.tables["products"] = make_products(10)
+
+    compressed = client.get("/api/products", headers={"Accept-Encoding": "br"})
+    entry = next(iter(server.catalog_cache.entries.values()))
+
+    assert compressed.headers["content-encoding"] == "br"
+    assert compressed.headers["etag"].endswith('-br"')
+    assert compressed.headers.get_list("vary") == ["Accept-Encoding"]
+    # Compressed once, at the catalog level, and not again by the middleware
+    raw = brotli.compress(entry.body, quality=server.CATALOG_COMPRESSION_LEVELS["br"])
+    assert compressed.headers["content-length"] == str(len(raw))
+    assert compressed.json() == orjson.loads(entry.body)
+
+    gzipped = client.get("/api/products", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(entry.encoded("gzip")) == entry.body
+    assert gzipped.json() == compressed.json()
@@ -0,0 +1,38 @@
+import uuid
+from email.utils import format_datetime, parsedate_to_datetime
+
+import server
+from tests.conftest import make_product
+
+
+def test_product_last_modified_is_its_updated_at(client, stub, admin_headers):
+    product = make_product(category_id=str(uuid.UUID(int=1)), updated_at="2026-02-01T10:30:00")
+    stub.tables["products"] = [product]
+
+    first = client.get(f"/api/products/{product['id']}")
+    assert first.headers["last-modified"] == "Sun, 01 Feb 2026 10:30:00 GMT"
+    since = {"If-Modified-Since": first.headers["last-modified"]}
+    assert client.get(f"/api/products/{product['id']}", headers=since).status_code == 304
+
+    update = {key: product[key] for key in ("name", "weight", "description", "features", "category_id")}
+    assert client.put(f"/api/products/{product['id']}", headers=admin_headers, json={**update, "price": 120}).status_code == 200
+
+    changed = client.get(f"/api/products/{product['id']}", headers=since)
+    assert changed.status_code == 200 and changed.json()["price"] == 120
+    assert parsedate_to_datetime(changed.headers["last-modified"]) > parsedate_to_datetime(since["If-Modified-Since"])
+
+
+def test_lists_and_rows_without_updated_at_send_no_last_modified(client, stub):
+    product = make_product(category_id=str(uuid.UUID(int=1)), updated_at="2026-02-01T10:30:00")
+    legacy = make_product(category_id=str(uuid.UUID(int=1)))
+    del legacy["updated_at"]
+    stub.tables["products"] = [product, legacy]
+    stub.tables["categories"] = [{"id": str(uuid.UUID(int=1)), "name": "Nuts", "created_at": "2026-01-01T00:00:00"}]
+
+    for path in ("/api/products", "/api/categories", f"/api/products/{legacy['id']}"):
+        response = client.get(path)
+        assert "last-modified" not in response.headers, path
+        # Without a Last-Modified, If-Modified-Since alone can never produce a 304
+        future = format_datetime(server.datetime(2030, 1, 1, tzinfo=server.timezone.utc), usegmt=True)
+        assert client.get(path, headers={"If-Modified-Since": future}).status_code == 200, path
+        assert client.get(path, headers={"If-None-Match": response.headers["etag"]}).status_code == 304, path
@@ -0,0 +1,89 @@
+import asyncio
+import time
+
+import server
+
+ABOUT = {"page": "about", "content": "We roast nuts.", "updated_at": "2026-01-01T00:00:00"}
+
+
+def test_pages_are_served_from_memory_after_one_load(client, stub):
+    stub.tables["content"] = [dict(ABOUT)]
+
+    first = client.get("/api/content/about")
+    second = client.get("/api/content/about")
+    missing = client.get("/api/content/faq")
+
+    assert first.json() == second.json() == ABOUT
+    assert missing.json() == {"page": "faq", "content": ""}
+    assert stub.calls_to("content") == 1
+
+
+def test_html_is_escaped_and_split_into_paragraphs(client, stub):
+    stub.tables["content"] = [{
+        "page": "about", "content": "Fresh <script>alert(1)</script> & co\nline two\n\n \n  Second paragraph  \n",
+    }]
+
+    html = client.get("/api/content/about", params={"format": "html"})
+    json = client.get("/api/content/about")
+
+    assert html.headers["content-type"] == "text/html; charset=utf-8"
+    assert html.text == "<p>Fresh &lt;script&gt;alert(1)&lt;/script&gt; &amp; co<br>line two</p><p>Second paragraph</p>"
+    assert html.headers["etag"] != json.headers["etag"]
+    assert client.get("/api/content/faq", params={"format": "html"}).text == ""
+
+
+def test_update_bumps_the_version_and_replaces_both_forms(client, stub, admin_headers):
+    stub.tables["content"] = [dict(ABOUT)]
+    before = client.get("/api/content/about")
+    version = server.content_store.version
+
+    response = client.put("/api/content/about", headers=admin_headers, json={"page": "about", "content": "Now with <b>dates</b>."})
+    after = client.get("/api/content/about", headers={"If-None-Match": before.headers["etag"]})
+
+    assert response.status_code == 200
+    assert server.content_store.version == version + 1
+    assert after.status_code == 200 and after.json()["content"] == "Now with <b>dates</b>."
+    assert client.get("/api/content/about", headers={"If-None-Match": after.headers["etag"]}).status_code == 304
+    assert client.get("/api/content/about", params={"format": "html"}).text == "<p>Now with &lt;b&gt;dates&lt;/b&gt;.</p>"
+    # The write went into memory; nothing was reloaded to serve it
+    assert stub.calls_to("content", "select") == 1
+
+
+def test_expired_store_keeps_serving_while_it_reloads(stub, caplog):
+    stub.tables["content"] = [dict(ABOUT)]
+    store = server.content_store
+
+    async def scenario():
+        await store.ensure_fresh()
+        # Another worker changes the page; this one only sees it on reload
+        stub.tables["content"][0]["content"] = "We roast and salt nuts."
+        store.loaded_at -= store.ttl
+        stub.latency = 0.2
+
+        started_at = time.perf_counter()
+        stale = await store.get("about")
+        elapsed = time.perf_counter() - started_at
+        await store.refresh_task
+        return stale, elapsed, await store.get("about")
+
+    stale, elapsed, fresh = asyncio.run(scenario())
+
+    assert elapsed < 0.1
+    assert stale.data["content"] == "We roast nuts."
+    assert fresh.data["content"] == "We roast and salt nuts."
+    assert store.version == 2
+
+    stub.latency = 0.0
+    stub.failure = ConnectionResetError("connection reset by peer")
+    store.loaded_at -= store.ttl
+
+    async def failing_refresh():
+        await store.ensure_fresh()
+        await store.refresh_task
+        return await store.get("about")
+
+    kept = asyncio.run(failing_refresh())
+
+    assert kept.data["content"] == "We roast and salt nuts."
+    assert store.version == 2 and store.is_stale()
+    assert "Content store refresh failed" in caplog.text
@@ -0,0 +1,103 @@
+import asyncio
+import csv
+import io
+import uuid
+
+import httpx
+import orjson
+import pytest
+
+import server
+
+
+def add_orders(stub, count: int):
+    stub.tables["orders"] = [
+        {
+            "id": str(uuid.UUID(int=n + 1)), "user_id": f"buyer-{n}", "user_email": f"buyer-{n}@example.com",
+            "items": [{"product_id": "p1", "product_name": "Cashews", "quantity": 1, "price": 100.0}],
+            "total_amount": 100.0, "payment_status": "paid", "delivery_status": "pending",
+            "created_at": f"2026-01-01T00:00:{n:02d}",
+        }
+        for n in range(count)
+    ]
+
+
+def fail_after(stub, monkeypatch, calls: int):
+    """Let the first calls orders selects through, then fail every later one"""
+    round_trip = stub.round_trip
+
+    def flaky(target, op):
+        round_trip(target, op)
+        if stub.calls_to("orders", "select") > calls:
+            raise ConnectionResetError("connection reset by peer")
+
+    monkeypatch.setattr(stub, "round_trip", flaky)
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(server, "EXPORT_CHUNK_SIZE", 2)
+
+
+def test_export_streams_every_order_across_chunks(client, stub, admin_headers, small_chunks):
+    add_orders(stub, 5)
+
+    ndjson = client.get("/api/admin/orders/export", params={"format": "ndjson"}, headers=admin_headers)
+    csv = client.get("/api/admin/orders/export", params={"format": "csv"}, headers=admin_headers)
+
+    assert [orjson.loads(line)["id"] for line in ndjson.text.splitlines()] == [row["id"] for row in stub.tables["orders"]]
+    assert len(csv.text.splitlines()) == 6
+
+
+@pytest.mark.parametrize("format", ["csv", "ndjson"])
+def test_export_failing_mid_stream_does_not_end_cleanly(client, stub, admin_headers, small_chunks, format, caplog, monkeypatch):
+    add_orders(stub, 5)
+    fail_after(stub, monkeypatch, 1)
+
+    with pytest.raises(Exception) as raised:
+        client.get("/api/admin/orders/export", params={"format": format}, headers=admin_headers)
+
+    # The failure reaches the server, which aborts the chunked body instead of terminating it
+    assert raised.errisinstance(ConnectionResetError) or raised.group_contains(ConnectionResetError)
+    assert "Order export failed" in caplog.text
+
+
+def test_concurrent_first_stats_requests_scan_orders_once(stub, admin_headers, small_chunks):
+    add_orders(stub, 5)
+    stub.latency = 0.01
+
+    async def first_requests():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*[http.get("/api/admin/stats", headers=admin_headers) for _ in range(8)])
+
+    responses = asyncio.run(first_requests())
+
+    assert [response.json()["orders"] for response in responses] == [5] * 8
+    assert stub.calls_to("orders", "select") == 3
+
+
+@pytest.mark.parametrize("flatten_items", [False, True])
+def test_csv_export_neutralises_formula_cells(client, stub, admin_headers, flatten_items):
+    add_orders(stub, 1)
+    stub.tables["orders"][0].update({
+        "customer_name": "=HYPERLINK(\"http://evil.example\",\"x\")", "customer_address": "@SUM(A1:A9)",
+        "customer_phone": "+911234567890", "delivery_type": "-1+1", "payment_status": "\tpaid",
+    })
+    stub.tables["orders"][0]["items"][0]["product_name"] = "=cmd|' /C calc'!A0"
+
+    response = client.get(
+        "/api/admin/orders/export", params={"format": "csv", "flatten_items": flatten_items}, headers=admin_headers
+    )
+    [row] = csv.DictReader(io.StringIO(response.text))
+
+    assert row["customer_name"] == "'=HYPERLINK(\"http://evil.example\",\"x\")"
+    assert row["customer_address"] == "'@SUM(A1:A9)"
+    assert row["customer_phone"] == "'+911234567890"
+    assert row["delivery_type"] == "'-1+1"
+    assert row["payment_status"] == "'\tpaid"
+    assert row["total_amount"] == "100.0" and row["id"] == stub.tables["orders"][0]["id"]
+    if flatten_items:
+        assert row["item_product_name"] == "'=cmd|' /C calc'!A0" and row["item_price"] == "100.0"
+    else:
+        assert orjson.loads(row["items"])[0]["product_name"] == "=cmd|' /C calc'!A0"
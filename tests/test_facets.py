@@ -0,0 +1,112 @@
+import random
+import statistics
+import time
+
+import pytest
+
+import server
+from tests.conftest import CATEGORIES, TAGS, benchmark_scale, make_products
+
+def random_filters(rnd: random.Random) -> dict:
+    bands = [label for label in map(server.price_band_label, (0, 300, 600, 1500)) if label]
+    choices = {
+        "category": lambda: rnd.sample(CATEGORIES, rnd.randint(1, 2)),
+        "tag": lambda: rnd.sample(TAGS, rnd.randint(1, 2)),
+        "featured": lambda: [rnd.choice(["true", "false"])],
+        "in_stock": lambda: ["true"],
+        "price": lambda: rnd.sample(bands, rnd.randint(1, 2)),
+    }
+    return {facet: choose() for facet, choose in choices.items() if rnd.random() < 0.5}
+
+
+def scan(products: list, filters: dict, match_all_tags: bool = False) -> tuple:
+    """Filter and count facets by looking at every product, as a client-side or full-table path does"""
+    def values(product):
+        facets = {}
+        for facet, value in server.product_facets(product):
+            facets.setdefault(facet, set()).add(value)
+        return facets
+
+    def matches(facets, skip=None):
+        for facet, selected in filters.items():
+            if facet == skip:
+                continue
+            present = facets.get(facet, set())
+            if facet == "tag" and match_all_tags:
+                if not set(selected) <= present:
+                    return False
+            elif not present & set(selected):
+                return False
+        return True
+
+    indexed = [(product, values(product)) for product in products]
+    ids = [product["id"] for product, facets in indexed if matches(facets)]
+    counts = {facet: {} for facet in server.FACETS}
+    for facet in server.FACETS:
+        for product, facets in indexed:
+            if matches(facets, skip=facet):
+                for value in facets.get(facet, ()):
+                    counts[facet][value] = counts[facet].get(value, 0) + 1
+    return ids, counts
+
+
+def engine(index: server.FacetIndex, filters: dict, match_all_tags: bool = False) -> tuple:
+    matches, selections = index.query(filters, match_all_tags)
+    return [product["id"] for product in index.rows(matches)], index.counts(selections)
+
+
+def test_filters_and_counts_match_a_full_scan():
+    products = make_products(3000)
+    index = server.FacetIndex(server.FACET_INDEX_TTL).rebuild(products)
+    rnd = random.Random(11)
+    for _ in range(50):
+        filters = random_filters(rnd)
+        match_all_tags = rnd.random() < 0.3
+        ids, counts = engine(index, filters, match_all_tags)
+        expected_ids, expected_counts = scan(products, filters, match_all_tags)
+        assert ids == expected_ids[::-1], filters
+        assert counts == expected_counts, filters
+
+
+def test_writes_patch_the_facet_index(client, stub, admin_headers):
+    products = make_products(20)
+    stub.tables["products"] = list(products)
+    assert client.get("/api/products", params={"tags": "gift", "facets": "true"}).status_code == 200
+
+    created = client.post("/api/products", headers=admin_headers, json={
+        "name": "Gift box", "weight": "1kg", "price": 900, "description": "Assorted", "features": [],
+        "category_id": CATEGORIES[0], "tags": ["gift"], "stock": 4,
+    }).json()
+    response = client.get("/api/products", params={"tags": "gift", "facets": "true"}).json()
+
+    expected_ids, expected_counts = scan(products + [created], {"tag": ["gift"]})
+    assert response["total"] == len(expected_ids)
+    assert response["products"][0]["id"] == created["id"]
+    assert response["facets"] == expected_counts
+    assert stub.calls_to("products", "select") == 1
+
+
+@pytest.mark.benchmark
+def test_facet_engine_against_a_full_scan():
+    products = make_products(100_000 * benchmark_scale())
+    index = server.FacetIndex(server.FACET_INDEX_TTL).rebuild(products)
+    rnd = random.Random(5)
+    requests = [random_filters(rnd) for _ in range(50)]
+
+    def timed(fn, runs):
+        timings = []
+        for filters in requests[:runs]:
+            started_at = time.perf_counter()
+            fn(filters)
+            timings.append((time.perf_counter() - started_at) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+    engine_p50, engine_p99 = timed(lambda filters: engine(index, filters), 50)
+    scan_p50, scan_p99 = timed(lambda filters: scan(products, filters), 5)
+    facet_values = sum(len(values) for values in index.bitmaps.values())
+    print(f"facet engine:  p50 {engine_p50:7.2f}ms  p99 {engine_p99:7.2f}ms, no upstream round-trips")
+    print(f"full scan:     p50 {scan_p50:7.2f}ms  p99 {scan_p99:7.2f}ms, plus fetching {len(products)} rows")
+    print(f"query per combination: 1 round-trip for the rows + {facet_values} for the facet counts")
+
+    assert engine_p99 < scan_p50 / 10
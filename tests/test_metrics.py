@@ -0,0 +1,78 @@
+import time
+
+from prometheus_client.parser import text_string_to_metric_families
+
+import server
+from tests.conftest import make_products
+
+
+def scrape(client, headers: dict = None) -> dict:
+    """Every sample in the /api/metrics body, keyed by (name, sorted labels)"""
+    response = client.get("/api/metrics", headers=headers)
+    assert response.status_code == 200
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(response.text)
+        for sample in family.samples
+    }
+
+
+def requests_total(samples: dict, route: str, status: str) -> float:
+    return samples.get(("http_requests_total", (("method", "GET"), ("route", route), ("status", status))), 0.0)
+
+
+def test_requests_are_labelled_by_route_template(client, stub):
+    products = make_products(2)
+    stub.tables["products"] = products
+    route = "/api/products/{product_id}"
+    before = scrape(client)
+
+    for product in products:
+        assert client.get(f"/api/products/{product['id']}").status_code == 200
+    assert client.get("/api/products/missing").status_code == 404
+    after = scrape(client)
+
+    assert requests_total(after, route, "200") == requests_total(before, route, "200") + 2
+    assert requests_total(after, route, "404") == requests_total(before, route, "404") + 1
+    assert not any(product["id"] in str(labels) for _, labels in after for product in products)
+    assert after[("http_request_duration_seconds_count", (("method", "GET"), ("route", route)))] >= 3
+
+
+def test_unmatched_paths_share_one_label(client, stub):
+    before = scrape(client)
+
+    for path in ("/api/nope", "/wp-login.php", f"/api/{time.time()}"):
+        assert client.get(path).status_code == 404
+    after = scrape(client)
+
+    assert requests_total(after, "unmatched", "404") == requests_total(before, "unmatched", "404") + 3
+    assert not any("nope" in str(labels) or "wp-login" in str(labels) for _, labels in after)
+
+
+def test_metrics_token_is_enforced(client, stub, monkeypatch):
+    assert client.get("/api/metrics").status_code == 200
+
+    monkeypatch.setattr(server, "METRICS_TOKEN", "scrape-secret")
+
+    assert client.get("/api/metrics").status_code == 401
+    assert client.get("/api/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert scrape(client, {"Authorization": "Bearer scrape-secret"})
+
+
+def test_scrape_includes_the_in_process_snapshots(client, stub):
+    client.get("/api/categories")
+    server.circuit_breakers["db"].state = "open"
+    server.circuit_breakers["db"].opened_at = time.monotonic()
+    server.admission_controls["orders"].rejected["ip_rate"] = 2
+    server.upload_index.record_duplicate(4096)
+
+    samples = scrape(client)
+
+    pool = server.supabase_pool_snapshot()
+    assert samples[("supabase_pool_size", ())] == pool["size"]
+    assert samples[("circuit_breaker_state", (("state", "open"), ("upstream", "db")))] == 1
+    assert samples[("circuit_breaker_state", (("state", "closed"), ("upstream", "db")))] == 0
+    assert samples[("catalog_cache_lookups_total", (("result", "misses"),))] == server.catalog_cache.snapshot()["misses"]
+    assert samples[("catalog_cache_entries", ())] == len(server.catalog_cache.entries)
+    assert samples[("admission_rejections_total", (("reason", "ip_rate"), ("route_class", "orders")))] == 2
+    assert samples[("upload_bytes_saved_total", ())] == 4096
@@ -0,0 +1,60 @@
+import uuid
+
+import pytest
+
+
+def add_order(stub, payment_status: str = "Pending", delivery_status: str = "Order Placed") -> str:
+    order_id = str(uuid.uuid4())
+    stub.tables.setdefault("orders", []).append({
+        "id": order_id, "user_id": "buyer", "items": [], "total_amount": 100.0,
+        "payment_status": payment_status, "delivery_status": delivery_status, "created_at": "2026-01-01T00:00:00",
+    })
+    return order_id
+
+
+def update_status(client, headers, **body):
+    return client.put("/api/admin/orders/status", headers=headers, json=body)
+
+
+@pytest.mark.parametrize("body", [
+    {"filter": {}},
+    {"filter": {"payment_status": None}},
+    {},
+    {"order_ids": [str(uuid.uuid4())], "filter": {"payment_status": "Pending"}},
+])
+def test_rejects_a_missing_or_empty_selection(client, stub, admin_headers, body):
+    add_order(stub)
+
+    response = update_status(client, admin_headers, payment_status="Paid", **body)
+
+    assert response.status_code == 400
+    assert stub.tables["orders"][0]["payment_status"] == "Pending"
+
+
+def test_results_are_keyed_by_the_stored_order_id(client, stub, admin_headers):
+    existing = add_order(stub)
+    missing = str(uuid.uuid4())
+
+    response = update_status(
+        client, admin_headers, payment_status="Paid",
+        order_ids=[existing.upper(), existing, missing.upper(), "not-a-uuid"],
+    )
+
+    assert response.json() == {
+        "updated": 1,
+        "results": [
+            {"id": existing, "status": "updated"},
+            {"id": missing, "status": "not_found"},
+            {"id": "not-a-uuid", "status": "not_found"},
+        ],
+    }
+
+
+def test_filter_updates_only_matching_orders(client, stub, admin_headers):
+    pending, paid = add_order(stub), add_order(stub, payment_status="Paid")
+
+    response = update_status(client, admin_headers, delivery_status="Packed", filter={"payment_status": "Paid"})
+
+    assert response.json()["results"] == [{"id": paid, "status": "updated"}]
+    statuses = {order["id"]: order["delivery_status"] for order in stub.tables["orders"]}
+    assert statuses == {pending: "Order Placed", paid: "Packed"}
@@ -0,0 +1,135 @@
+import asyncio
+import time
+import uuid
+
+import httpx
+from postgrest.exceptions import APIError
+
+import server
+from tests.conftest import add_product, auth_headers
+
+
+def place_order_rpc(client, params):
+    """What place_order does in Postgres: lock the products, check, decrement and insert together"""
+    order = params["new_order"]
+    with client.lock:
+        products = {row["id"]: row for row in client.tables.get("products", [])}
+        wanted = {}
+        for item in order["items"]:
+            wanted[item["product_id"]] = wanted.get(item["product_id"], 0) + item["quantity"]
+        short = sorted(
+            product_id for product_id, quantity in wanted.items()
+            if product_id not in products or (products[product_id].get("stock") or 0) < quantity
+        )
+        if short:
+            raise APIError({"message": "insufficient_stock", "details": ",".join(short), "code": "P0001"})
+        for product_id, quantity in wanted.items():
+            products[product_id]["stock"] -= quantity
+        stored = {**order, "id": str(uuid.uuid4())}
+        client.tables.setdefault("orders", []).append(stored)
+        return {
+            "order": stored,
+            "stock": [{"product_id": product_id, "stock": products[product_id]["stock"]} for product_id in wanted],
+        }
+
+
+def order_body(*lines: tuple) -> dict:
+    items = [
+        {"product_id": product_id, "product_name": "Cashews", "quantity": quantity, "price": 100.0}
+        for product_id, quantity in lines
+    ]
+    return {"items": items, "total_amount": 100.0 * sum(quantity for _, quantity in lines)}
+
+
+def test_concurrent_orders_for_one_sku_never_oversell(stub):
+    stock = 25
+    clients = 80
+    stub.rpcs["place_order"] = place_order_rpc
+    stub.latency = 0.005
+    sku = add_product(stub, stock=stock)
+
+    async def hammer():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await asyncio.gather(*[
+                http.post("/api/orders", json=order_body((sku, 1)), headers=auth_headers(f"buyer-{n}"))
+                for n in range(clients)
+            ])
+
+    responses = asyncio.run(hammer())
+    statuses = [response.status_code for response in responses]
+    assert statuses.count(200) == stock
+    assert statuses.count(409) == clients - stock
+    assert all(response.json()["detail"]["product_ids"] == [sku] for response in responses if response.status_code == 409)
+
+    orders = stub.tables["orders"]
+    assert len(orders) == stock
+    assert sum(item["quantity"] for order in orders for item in order["items"]) == stock
+    assert stub.tables["products"][0]["stock"] == 0
+
+    # One place_order round-trip per order and no per-item reads or writes;
+    # the only products call is the price index load
+    assert stub.calls_to("rpc", "place_order") == clients
+    assert stub.calls_to("products") == 1
+    assert stub.calls_to("orders") == 0
+
+
+def test_order_short_on_one_line_takes_no_stock(client, stub):
+    stub.rpcs["place_order"] = place_order_rpc
+    plenty = add_product(stub, stock=10)
+    scarce = add_product(stub, stock=1)
+
+    response = client.post("/api/orders", json=order_body((plenty, 2), (scarce, 2)), headers=auth_headers("buyer"))
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["product_ids"] == [scarce]
+    assert [row["stock"] for row in stub.tables["products"]] == [10, 1]
+    assert "orders" not in stub.tables
+
+
+def test_order_updates_cached_stock_levels(client, stub):
+    stub.rpcs["place_order"] = place_order_rpc
+    sku = add_product(stub, stock=3)
+
+    response = client.post("/api/orders", json=order_body((sku, 2)), headers=auth_headers("buyer"))
+
+    assert response.status_code == 200
+    assert response.json()["items"][0]["quantity"] == 2
+    assert server.price_index.products[sku][1] == 1
+
+
+def test_price_index_loads_every_page_past_the_postgrest_row_cap(client, stub):
+    stub.max_rows = 1000
+    for _ in range(2100):
+        last = add_product(stub, stock=1)
+
+    response = client.post("/api/orders/quote", json={"items": [{"product_id": last, "quantity": 1}]})
+
+    assert response.json()["errors"] == []
+    assert len(server.price_index.products) == 2100
+    assert stub.calls_to("products", "select") == 5
+
+
+def test_expired_price_index_refreshes_in_the_background(stub):
+    sku = add_product(stub, stock=5, price=100.0)
+    item = server.QuoteItem(product_id=sku, quantity=1)
+
+    async def scenario():
+        await server.price_index.ensure_fresh()
+        stub.tables["products"][0]["price"] = 150.0
+        server.price_index.loaded_at -= server.price_index.ttl
+        stub.latency = 0.2
+
+        started_at = time.perf_counter()
+        stale = await server.price_index.quote([item], None)
+        elapsed = time.perf_counter() - started_at
+        await server.price_index.refresh_task
+        return stale, elapsed, await server.price_index.quote([item], None)
+
+    stale, elapsed, fresh = asyncio.run(scenario())
+
+    # The checkout path keeps quoting from the old map instead of waiting on the reload
+    assert elapsed < 0.1
+    assert stale["items"][0]["price"] == 100.0
+    assert fresh["items"][0]["price"] == 150.0
+    assert stub.calls_to("products", "select") == 2
@@ -0,0 +1,143 @@
+import asyncio
+import gc
+import math
+import random
+import statistics
+import time
+
+import httpx
+import pytest
+
+import server
+from tests.conftest import WORDS, benchmark_scale, make_products
+
+QUERIES = ["cashew", "roasted almond", "jumbo kashmiri walnut", "honey coated spicy masala", "sku77", "zzz"]
+
+
+def brute_force(products: list, query: str, category_id=None, limit: int = 20) -> list:
+    """Rank every product with plain BM25 from scratch"""
+    docs = [(product, server.document_terms(product)) for product in products]
+    average_length = sum(sum(terms.values()) for _, terms in docs) / len(docs)
+    terms = set(server.tokenize(query))
+    frequencies = {term: sum(1 for _, doc_terms in docs if term in doc_terms) for term in terms}
+    scored = []
+    for position, (product, doc_terms) in enumerate(docs):
+        if category_id and product["category_id"] != category_id:
+            continue
+        length = sum(doc_terms.values())
+        score = 0.0
+        for term in terms & set(doc_terms):
+            idf = math.log(1 + (len(docs) - frequencies[term] + 0.5) / (frequencies[term] + 0.5))
+            frequency = doc_terms[term]
+            score += idf * frequency * (server.BM25_K1 + 1) / (
+                frequency + server.BM25_K1 * (1 - server.BM25_B + server.BM25_B * length / average_length)
+            )
+        if score:
+            scored.append((-score, position, product["id"]))
+    return [(product_id, round(-score, 4)) for score, _, product_id in sorted(scored)[:limit]]
+
+
+def ranking(index: server.SearchIndex, query: str, category_id=None, limit: int = 20) -> list:
+    return [(result["id"], result["score"]) for result in index.search(query, category_id, limit)]
+
+
+def test_incremental_writes_keep_ranking_identical_to_a_full_scan():
+    products = make_products(400)
+    index = server.SearchIndex(server.SEARCH_INDEX_TTL).rebuild(products[:200])
+    live = {product["id"]: product for product in products[:200]}
+
+    rnd = random.Random(7)
+    for product in products[200:]:
+        index.upsert(product)
+        live[product["id"]] = product
+    for product_id in rnd.sample(sorted(live), 60):
+        index.remove(product_id)
+        del live[product_id]
+    for product_id in rnd.sample(sorted(live), 60):
+        updated = {**live[product_id], "description": " ".join(rnd.choices(WORDS, k=40))}
+        index.upsert(updated)
+        live[product_id] = updated
+
+    # Products keep the position they were first indexed at, which breaks score ties
+    first_seen = {product["id"]: position for position, product in enumerate(products)}
+    ordered = sorted(live.values(), key=lambda product: first_seen[product["id"]])
+    for query in QUERIES:
+        assert ranking(index, query) == brute_force(ordered, query), query
+        category_id = ordered[0]["category_id"]
+        assert ranking(index, query, category_id) == brute_force(ordered, query, category_id), query
+
+
+def test_search_route_returns_ranked_results(client, stub):
+    products = make_products(50)
+    stub.tables["products"] = products
+
+    response = client.get("/api/products/search", params={"q": "sku7"})
+
+    assert response.status_code == 200
+    assert [result["id"] for result in response.json()["results"]] == [products[7]["id"]]
+
+
+def test_index_load_pages_past_the_postgrest_row_cap(client, stub):
+    stub.max_rows = 1000
+    stub.tables["products"] = make_products(2300)
+
+    response = client.get("/api/products/search", params={"q": "sku2299"})
+
+    assert len(response.json()["results"]) == 1
+    assert len(server.search_index.positions) == 2300
+    assert stub.calls_to("products", "select") == 5
+
+
+@pytest.mark.benchmark
+def test_search_latency_on_a_100k_catalog():
+    products = make_products(100_000 * benchmark_scale())
+    started_at = time.perf_counter()
+    index = server.SearchIndex(server.SEARCH_INDEX_TTL).rebuild(products)
+    print(f"build {len(products)} products: {time.perf_counter() - started_at:.1f}s")
+    # Collect the build's (and earlier tests') garbage now rather than inside a timed search
+    gc.collect()
+
+    p99s = {}
+    for query in QUERIES:
+        for category_id in (None, products[3]["category_id"]):
+            timings = []
+            for _ in range(100):
+                started_at = time.perf_counter()
+                index.search(query, category_id, 20)
+                timings.append((time.perf_counter() - started_at) * 1000)
+            timings.sort()
+            p99s[(query, category_id)] = timings[98]
+            print(f"{query!r:28} category={bool(category_id)!s:5} p50 {statistics.median(timings):6.2f}ms  p99 {timings[98]:6.2f}ms")
+
+    assert max(p99s.values()) < 5 * benchmark_scale()
+
+
+@pytest.mark.parametrize("index_name", ["search_index", "facet_index"])
+def test_writes_during_a_load_survive_the_rebuild(stub, admin_headers, monkeypatch, index_name):
+    products = make_products(20)
+    stub.tables["products"] = [dict(product) for product in products]
+    monkeypatch.setattr(server, "CATALOG_INDEX_PAGE_SIZE", 2)
+    stub.latency = 0.05
+    index = getattr(server, index_name)
+    deleted, updated = products[0], products[1]
+    body = {
+        "name": "renamed walnut", "weight": "250g", "price": 100.0, "description": updated["description"],
+        "features": updated["features"], "category_id": updated["category_id"], "tags": ["gift"],
+    }
+
+    async def write_during_load():
+        load = asyncio.create_task(index.load())
+        # Let the first page, holding both products, be read before they change
+        await asyncio.sleep(0.08)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            assert (await http.delete(f"/api/products/{deleted['id']}", headers=admin_headers)).status_code == 200
+            assert (await http.put(f"/api/products/{updated['id']}", headers=admin_headers, json=body)).status_code == 200
+        assert not load.done()
+        await load
+
+    asyncio.run(write_during_load())
+
+    assert deleted["id"] not in index.positions
+    assert index.products[index.positions[updated["id"]]]["name"] == "renamed walnut"
+    assert len(index.positions) == 19
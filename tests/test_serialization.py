@@ -0,0 +1,64 @@
+import json
+import statistics
+import time
+import uuid
+
+import orjson
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from tests.conftest import auth_headers, benchmark_scale, make_products
+
+
+def sample_orders(count: int) -> list:
+    item = {"product_id": str(uuid.UUID(int=1)), "product_name": "Premium Cashews", "quantity": 2, "price": 299.0}
+    return [
+        {
+            "id": str(uuid.UUID(int=n + 1)), "user_id": "buyer", "user_email": "buyer@example.com", "items": [item] * 3,
+            "total_amount": 1844.0, "payment_status": "Paid", "delivery_status": "Shipped", "customer_name": "Asha",
+            "customer_phone": "9999999999", "customer_address": "12 Ring Road, Delhi", "delivery_charge": 50,
+            "delivery_type": "within-delhi", "created_at": f"2026-01-01T00:00:00.{n:06d}",
+        }
+        for n in range(count)
+    ]
+
+
+def test_batch_lookup_returns_products_in_request_order(client, stub):
+    products = make_products(3)
+    stub.tables["products"] = products
+    ids = [products[2]["id"], "missing", products[0]["id"]]
+
+    response = client.get("/api/products/batch", params={"ids": ",".join(ids)})
+
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"products": [products[2], products[0]], "missing": ["missing"]}
+
+
+def test_orders_listing_matches_the_default_encoder(client, stub):
+    stub.tables["orders"] = sample_orders(5)
+
+    response = client.get("/api/orders", headers=auth_headers("admin-1", "admin"))
+
+    assert response.json() == json.loads(JSONResponse(jsonable_encoder(stub.tables["orders"])).body)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("rows", [make_products, sample_orders], ids=["products", "orders"])
+def test_serialization_cost_per_1k_rows(rows):
+    data = rows(1000 * benchmark_scale())
+
+    def median_ms(render, runs=30):
+        timings = []
+        for _ in range(runs):
+            started_at = time.perf_counter()
+            render()
+            timings.append((time.perf_counter() - started_at) * 1000)
+        return statistics.median(timings)
+
+    default = median_ms(lambda: JSONResponse(jsonable_encoder(data)))
+    fast = median_ms(lambda: ORJSONResponse(data))
+    print(f"{len(data)} {rows.__name__.split('_')[1]}: jsonable_encoder + JSONResponse {default:.2f}ms, ORJSONResponse {fast:.2f}ms")
+
+    assert orjson.loads(ORJSONResponse(data).body) == json.loads(JSONResponse(jsonable_encoder(data)).body)
+    assert fast * 5 < default
@@ -0,0 +1,235 @@
+import asyncio
+import hashlib
+import io
+import random
+import statistics
+import time
+import tracemalloc
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import server
+from tests.conftest import benchmark_scale
+from tests.supabase_stub import Bucket
+
+
+def noise_image(width: int, height: int, seed: int = 0, format: str = "PNG") -> bytes:
+    """Random pixels, so the encoded file is about as large as the raw image"""
+    image = Image.frombytes("RGB", (width, height), random.Random(seed).randbytes(width * height * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format)
+    return buffer.getvalue()
+
+
+def upload(client, headers, content: bytes, name: str = "photo.png"):
+    return client.post("/api/upload", headers=headers, files={"file": (name, content, "image/png")})
+
+
+def test_upload_stores_original_and_variants(client, stub, admin_headers):
+    response = upload(client, admin_headers, noise_image(400, 300))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["duplicate"] is False
+    stem = body["url"].rsplit("/", 1)[1].rsplit(".", 1)[0]
+    assert sorted(stub.blobs) == sorted(
+        [f"products/{stem}.png"]
+        + [f"products/{stem}_{width}.{extension}" for width in server.IMAGE_VARIANT_WIDTHS for extension in ("png", "webp")]
+    )
+    assert set(body["srcset"]) == {"image/png", "image/webp"}
+
+
+def test_repeat_upload_is_answered_without_a_storage_write(client, stub, admin_headers):
+    content = noise_image(200, 200)
+    first = upload(client, admin_headers, content).json()
+    writes = stub.calls_to("storage", "upload")
+
+    second = upload(client, admin_headers, content, name="again.png").json()
+
+    assert second["duplicate"] is True and second["url"] == first["url"]
+    assert stub.calls_to("storage", "upload") == writes
+    assert client.get("/api/admin/uploads/stats", headers=admin_headers).json()["duplicates"] == 1
+
+
+def test_failed_variant_upload_is_retried_in_full(client, stub, admin_headers, monkeypatch):
+    content = noise_image(400, 300)
+    upload_blob = Bucket.upload
+
+    def fail_one_variant(bucket, path, content, file_options=None):
+        if path.endswith(f"_{server.IMAGE_VARIANT_WIDTHS[-1]}.webp"):
+            raise ValueError("storage write rejected")
+        return upload_blob(bucket, path, content, file_options)
+
+    monkeypatch.setattr(Bucket, "upload", fail_one_variant)
+    assert upload(client, admin_headers, content).status_code >= 500
+    # Without its original the half-stored upload is not mistaken for a duplicate
+    assert stub.blobs and f"products/{hashlib.sha256(content).hexdigest()}.png" not in stub.blobs
+
+    monkeypatch.setattr(Bucket, "upload", upload_blob)
+    retried = upload(client, admin_headers, content).json()
+
+    assert retried["duplicate"] is False
+    assert len(stub.blobs) == 1 + 2 * len(server.IMAGE_VARIANT_WIDTHS)
+
+
+def test_bucket_lookup_ignores_an_original_without_its_variants(client, stub, admin_headers):
+    content = noise_image(200, 200)
+    first = upload(client, admin_headers, content).json()
+    stem = first["url"].rsplit("/", 1)[1].rsplit(".", 1)[0]
+    del stub.blobs[f"products/{stem}_{server.IMAGE_VARIANT_WIDTHS[-1]}.webp"]
+    server.upload_index = server.UploadIndex(server.UPLOAD_INDEX_SIZE)
+
+    again = upload(client, admin_headers, content).json()
+
+    assert again["duplicate"] is False
+    assert f"products/{stem}_{server.IMAGE_VARIANT_WIDTHS[-1]}.webp" in stub.blobs
+
+    server.upload_index = server.UploadIndex(server.UPLOAD_INDEX_SIZE)
+    assert upload(client, admin_headers, content).json()["duplicate"] is True
+
+
+def test_upload_rejects_oversized_and_non_image_bodies(client, stub, admin_headers, monkeypatch):
+    assert upload(client, admin_headers, b"%PDF-1.7 not an image", name="photo.png").status_code == 415
+
+    monkeypatch.setattr(server, "UPLOAD_MAX_BYTES", 1024)
+    assert upload(client, admin_headers, noise_image(200, 200)).status_code == 413
+    assert stub.calls_to("storage") == 0
+
+
+def limited_app(limit: int) -> tuple:
+    """A bare app behind UploadSizeLimitMiddleware, recording the body sizes its handler read"""
+    app = FastAPI()
+    received = []
+
+    @app.post("/upload")
+    async def read_upload(request: Request):
+        received.append(len(await request.body()))
+        return {"size": received[-1]}
+
+    @app.post("/other")
+    async def read_other(request: Request):
+        return {"size": len(await request.body())}
+
+    return server.UploadSizeLimitMiddleware(app, limits={"/upload": limit}), received
+
+
+def test_size_limit_rejects_a_declared_content_length_before_reading(stub):
+    app, received = limited_app(256)
+    client = TestClient(app)
+
+    assert client.post("/upload", content=b"x" * 256).json() == {"size": 256}
+    response = client.post("/upload", content=b"x" * 257)
+
+    assert response.status_code == 413 and response.json() == {"detail": "Upload exceeds 256 bytes"}
+    assert received == [256]
+    assert client.post("/other", content=b"x" * 1024).json() == {"size": 1024}
+
+
+def test_size_limit_counts_chunked_bodies_as_they_arrive(stub):
+    app, received = limited_app(256)
+    sent = []
+
+    async def body(chunks: int):
+        for _ in range(chunks):
+            sent.append(100)
+            yield b"x" * 100
+
+    async def post(chunks: int):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+            return await http.post("/upload", content=body(chunks))
+
+    small = asyncio.run(post(2))
+    assert "content-length" not in small.request.headers
+    assert small.json() == {"size": 200}
+
+    sent.clear()
+    response = asyncio.run(post(50))
+
+    # The body is cut off at the chunk that crosses the limit, not read to the end
+    assert response.status_code == 413 and response.json() == {"detail": "Upload exceeds 256 bytes"}
+    assert len(sent) == 3 and received == [200]
+
+
+def test_upload_route_sits_behind_the_size_limit(client, stub, admin_headers):
+    limit = server.UPLOAD_MAX_BYTES + server.UPLOAD_FORM_OVERHEAD
+
+    response = client.post("/api/upload", headers=admin_headers, content=b"\0" * (limit + 1))
+
+    assert response.status_code == 413 and response.json() == {"detail": f"Upload exceeds {limit} bytes"}
+    assert stub.calls_to("storage") == 0
+
+
+async def upload_files(paths: list, in_flight: int, headers: dict) -> list:
+    """Upload every file with in_flight requests outstanding, streaming each from disk"""
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as http:
+        remaining = iter(paths)
+        responses = []
+
+        async def worker():
+            for path in remaining:
+                with open(path, "rb") as stream:
+                    responses.append(await http.post("/api/upload", headers=headers, files={"file": stream}))
+
+        await asyncio.gather(*[worker() for _ in range(in_flight)])
+        return responses
+
+
+@pytest.mark.benchmark
+def test_upload_memory_stays_flat_for_large_images(stub, admin_headers, tmp_path, monkeypatch):
+    stub.keep_blobs = False
+    # Rendered variants come back from the image pool as bytes; keep them tiny
+    # so the peak reflects how the upload body itself is handled
+    monkeypatch.setattr(server, "IMAGE_VARIANT_WIDTHS", [64])
+    path = tmp_path / "large.png"
+    path.write_bytes(noise_image(1800, 1400 * benchmark_scale()))
+    size = path.stat().st_size
+
+    tracemalloc.start()
+    try:
+        [response] = asyncio.run(upload_files([path], 1, admin_headers))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert response.status_code == 200
+    print(f"upload of {size / 2**20:.1f} MB: peak traced memory {peak / 2**20:.2f} MB")
+    # Reading the body into memory, as file.read() did, would peak above the file size
+    assert peak < size / 2
+
+
+@pytest.mark.benchmark
+def test_upload_throughput_and_event_loop_latency(stub, admin_headers, tmp_path):
+    stub.keep_blobs = False
+    paths = []
+    for n in range(8 * benchmark_scale()):
+        path = tmp_path / f"photo-{n}.jpg"
+        path.write_bytes(noise_image(1600, 1200, seed=n, format="JPEG"))
+        paths.append(path)
+    megabytes = sum(path.stat().st_size for path in paths) / 2**20
+
+    async def scenario():
+        uploads = asyncio.create_task(upload_files(paths, 4, admin_headers))
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            health = []
+            while not uploads.done():
+                started_at = time.perf_counter()
+                assert (await http.get("/api/health")).status_code == 200
+                health.append((time.perf_counter() - started_at) * 1000)
+                await asyncio.sleep(0.02)
+        return await uploads, sorted(health)
+
+    started_at = time.perf_counter()
+    responses, health = asyncio.run(scenario())
+    elapsed = time.perf_counter() - started_at
+
+    assert all(response.status_code == 200 for response in responses)
+    print(f"{len(paths)} uploads ({megabytes:.1f} MB): {len(paths) / elapsed:.2f} uploads/s, {megabytes / elapsed:.1f} MB/s")
+    print(f"/api/health during uploads: p50 {statistics.median(health):.1f}ms  max {health[-1]:.1f}ms")
+    # Hashing, staging and rendering run off the event loop, so other requests keep being served
+    assert statistics.median(health) < 50
@@ -0,0 +1,65 @@
+import time
+import types
+
+import server
+
+
+def sign_up(stub, count: int) -> list:
+    """Add users in sign-up order; the stub lists them newest first"""
+    start = len(stub.users)
+    users = [
+        types.SimpleNamespace(id=f"user-{n}", email=f"User{n}@Example.com", user_metadata={"role": "user"}, created_at=None)
+        for n in range(start, start + count)
+    ]
+    stub.users.update({user.id: user for user in users})
+    return users
+
+
+def find(client, admin_headers, email: str):
+    return client.get("/api/admin/users", params={"email": email}, headers=admin_headers)
+
+
+def test_load_pages_through_every_user(client, stub, admin_headers, monkeypatch):
+    monkeypatch.setattr(server, "user_directory", server.UserDirectory(server.USER_DIRECTORY_TTL, 5))
+    sign_up(stub, 23)
+
+    oldest = find(client, admin_headers, "user0@example.com")
+
+    assert oldest.status_code == 200 and oldest.json()["id"] == "user-0"
+    assert stub.calls_to("auth", "list_users") == 5
+    assert find(client, admin_headers, "USER22@example.com").json()["id"] == "user-22"
+    assert stub.calls_to("auth", "list_users") == 5
+
+
+def test_a_miss_catches_up_on_the_newest_pages_only(client, stub, admin_headers, monkeypatch):
+    monkeypatch.setattr(server, "user_directory", server.UserDirectory(server.USER_DIRECTORY_TTL, 5))
+    sign_up(stub, 30)
+    assert find(client, admin_headers, "user0@example.com").status_code == 200
+    loaded = stub.calls_to("auth", "list_users")
+    assert loaded == 7
+
+    sign_up(stub, 6)
+    server.user_directory.caught_up_at -= server.USER_DIRECTORY_CATCHUP_INTERVAL
+
+    # Page 1 is all new, page 2 has the last new user, page 3 has none and ends the catch-up
+    assert find(client, admin_headers, "user30@example.com").json()["id"] == "user-30"
+    assert stub.calls_to("auth", "list_users") == loaded + 3
+    assert find(client, admin_headers, "user35@example.com").json()["id"] == "user-35"
+    assert stub.calls_to("auth", "list_users") == loaded + 3
+
+
+def test_catch_up_is_rate_limited(client, stub, admin_headers):
+    sign_up(stub, 3)
+    assert find(client, admin_headers, "user0@example.com").status_code == 200
+    loaded = stub.calls_to("auth", "list_users")
+
+    sign_up(stub, 1)
+    # The load just caught up, so misses within the interval are answered from the index
+    assert find(client, admin_headers, "user3@example.com").status_code == 404
+    assert find(client, admin_headers, "nobody@example.com").status_code == 404
+    assert stub.calls_to("auth", "list_users") == loaded
+
+    server.user_directory.caught_up_at = time.monotonic() - server.USER_DIRECTORY_CATCHUP_INTERVAL
+    assert find(client, admin_headers, "user3@example.com").status_code == 200
+    assert find(client, admin_headers, "nobody@example.com").status_code == 404
+    assert stub.calls_to("auth", "list_users") == loaded + 1